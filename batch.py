@@ -0,0 +1,181 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+from services.marks import build_marks, char_marks, create_cache, create_llm
+from services.watermark import CharMark, WatermarkPipeline
+
+# headless batch watermarking / detection over jsonl (or plain text) corpora, no tk involved:
+#   python batch.py answers.jsonl -o marked.jsonl --marks upper ab --detect
+#   python batch.py human.txt --no-mark --detect > scores.jsonl
+# every input record comes back (in order) with the marked text of every mark under "marked"
+# (one string with --combine), and with --detect, the detector scores of the outgoing text under "scores".
+# work is spread over a process pool in chunks of lines; only a bounded window of chunks is in flight, so
+# memory stays flat however large the corpus is. only acrostic needs the network (and --config).
+
+# per worker process state, set up by _init
+_marks: dict = {}
+_options: dict = {}
+_threads: ThreadPoolExecutor | None = None
+
+
+def _load_config(path: str | None) -> dict:
+    if not path: return {}
+    import yaml
+    with open(path, 'rt') as f:
+        return yaml.safe_load(f) or {}
+
+
+def _init(config_path: str | None, names: list[str], options: dict):
+    global _threads
+    config = _load_config(config_path)
+    # acrostic (the only network mark) gets its own llm client and the shared disk cache
+    llm = create_llm(config) if "acrostic" in names else None
+    _marks.update(build_marks(config, llm, create_cache(config) if llm else None, names))
+    _options.update(options)
+    # blocking (network) marks run their texts concurrently, bounded by the llm client
+    _threads = ThreadPoolExecutor(max_workers=int(config.get('llm_max_concurrency', 4)))
+
+
+def _watermark(mark, texts: list[str]) -> list[str]:
+    if isinstance(mark, CharMark) or len(texts) < 2: return [mark(t) for t in texts]
+    return list(_threads.map(mark, texts))
+
+
+def _process(lines: list[str]) -> tuple[str, int]:
+    # one chunk of raw input lines -> (output lines, number of bad lines)
+    field = _options["field"]
+    records, texts, bad = [], [], 0
+    for line in lines:
+        if _options["format"] == "text":
+            record = {field: line.rstrip("\r\n")}
+        else:
+            if not line.strip(): continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                bad += 1
+                print(f"batch: skipping bad line: {e}", file=sys.stderr)
+                continue
+        text = record.get(field) if isinstance(record, dict) else None
+        if not isinstance(text, str):
+            bad += 1
+            print(f"batch: skipping record without a '{field}' string", file=sys.stderr)
+            continue
+        records.append(record)
+        texts.append(text)
+
+    detect = _options["detect"]
+    if detect:
+        from services import detection
+
+    names = [n for n in _options["marks"] if n in _marks]
+    if _options["no_mark"]:
+        if detect:
+            scores = detection.score_batch(texts, names)
+            for i, r in enumerate(records):
+                r["scores"] = {n: float(s[i]) for n, s in scores.items()}
+    elif _options["combine"]:
+        pipeline = WatermarkPipeline(_marks[n][0] if isinstance(_marks[n], tuple) else _marks[n] for n in names)
+        marked = pipeline.apply_batch(texts) if all(isinstance(_marks[n], tuple) for n in names) \
+            else _watermark(pipeline, texts)
+        if detect: scores = detection.score_batch(marked, names)
+        for i, r in enumerate(records):
+            r["marked"] = marked[i]
+            if detect: r["scores"] = {n: float(s[i]) for n, s in scores.items()}
+    else:
+        for r in records:
+            r["marked"] = {}
+            if detect: r["scores"] = {}
+        for n in names:
+            mark = _marks[n][0] if isinstance(_marks[n], tuple) else _marks[n]
+            marked = _watermark(mark, texts)
+            score = detection.score_batch(marked, [n]).get(n) if detect else None
+            for i, r in enumerate(records):
+                r["marked"][n] = marked[i]
+                if score is not None: r["scores"][n] = float(score[i])
+
+    out = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+    return out, bad
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[list[str]]:
+    it = iter(lines)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def run(
+        lines: Iterable[str], out, marks: list[str], config_path: str | None = None,
+        workers: int | None = None, chunk: int = 1000, **options
+) -> tuple[int, int]:
+    # streams the processed chunks to out, in input order. returns (chunks, bad lines)
+    workers = workers or os.cpu_count() or 1
+    window = 2 * workers
+    pending = deque()
+    n_chunks = bad = 0
+    initargs = (config_path, marks, {**options, "marks": marks})
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=initargs) as pool:
+        for c in _chunks(lines, chunk):
+            pending.append(pool.submit(_process, c))
+            if len(pending) < window: continue
+            text, b = pending.popleft().result()
+            out.write(text)
+            n_chunks, bad = n_chunks + 1, bad + b
+        while pending:
+            text, b = pending.popleft().result()
+            out.write(text)
+            n_chunks, bad = n_chunks + 1, bad + b
+    return n_chunks, bad
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="watermark / detect a jsonl or text corpus, headless")
+    parser.add_argument("input", nargs="?", default="-", help="jsonl or text file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output jsonl, - for stdout")
+    parser.add_argument("--format", choices=("jsonl", "text"), help="input format (default: from the extension)")
+    parser.add_argument("--field", default="text", help="record field holding the text")
+    parser.add_argument("--marks", nargs="+", help="marks to apply (default: config watermarks, or every char mark)")
+    parser.add_argument("--config", help="config.yml, needed for acrostic")
+    parser.add_argument("--combine", action="store_true", help="apply all marks together, in one pipeline")
+    parser.add_argument("--detect", action="store_true", help="add detector scores of the outgoing text")
+    parser.add_argument("--no-mark", action="store_true", help="only score the input text (implies --detect)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: cpu count)")
+    parser.add_argument("--chunk", type=int, default=1000, help="lines per work item")
+    args = parser.parse_args(argv)
+
+    config = _load_config(args.config)
+    marks = args.marks or config.get('watermarks') or list(char_marks)
+    known = {*char_marks, "acrostic"}
+    unknown = [m for m in marks if m not in known]
+    if unknown: parser.error(f"unknown marks: {', '.join(unknown)}")
+    if "acrostic" in marks and not args.config: parser.error("acrostic needs --config")
+    if args.no_mark: args.detect = True
+
+    fmt = args.format or ("text" if args.input.endswith(".txt") else "jsonl")
+    src = sys.stdin if args.input == "-" else open(args.input, "rt", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "wt", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        n_chunks, bad = run(
+            src, dst, marks, args.config, args.workers, args.chunk,
+            field=args.field, format=fmt, combine=args.combine, detect=args.detect, no_mark=args.no_mark,
+        )
+    finally:
+        if src is not sys.stdin: src.close()
+        if dst is not sys.stdout: dst.close()
+    print(
+        f"batch: {n_chunks} chunks in {time.perf_counter() - start:.1f}s"
+        + (f", {bad} bad lines skipped" if bad else ""),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
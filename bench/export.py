@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import export
+from bench.fakes import FakeFirestore
+from services import telemetry
+from services.writer import WriteBehindWriter
+from services.survey import SurveySession
+
+# export.py sync check: a full export, a rerun with nothing new, and one after a few sessions were added or
+# changed, verifying the reruns only read what changed and the tables end up matching the database.
+# runs against the in-process fake by default, or the firestore emulator when FIRESTORE_EMULATOR_HOST is set:
+#   gcloud emulators firestore start --host-port=localhost:8080
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m bench.export
+# usage: python -m bench.export [--sessions 300] [--pages 2] [--page-size 100]
+
+
+def make_db():
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"): return export.make_db()
+    return FakeFirestore()
+
+
+def populate(writer: WriteBehindWriter, sessions: int, pages: int) -> list[SurveySession]:
+    out = []
+    for s in range(sessions):
+        session = SurveySession(db=None, user_id=f"bench-{s}", writer=writer)
+        recorder = telemetry.EventRecorder()
+        for _ in range(random.randrange(50)): recorder.record(telemetry.code(telemetry.KEY, telemetry.QUERY))
+        for i in range(pages):
+            session.save_question(i, {
+                "t": random.randrange(600), "timings": [{"total_ms": 1234.5}], "telemetry": recorder.pack(),
+                "question": "q", "user_query": "u", "model_response": "r" * 500,
+                "user_survey": {"is_wm": True, "reasoning": "x" * 40, "text_edited": "t", "edited_action": "y" * 40},
+                "assignment": {"mark": "upper", "question": i, "marked": True},
+            })
+        session.save_demographics({"gender": "f", "age": "21-25"})
+        out.append(session)
+    writer.flush()
+    return out
+
+
+def run(db, out: str, label: str, **options) -> dict:
+    t = time.perf_counter()
+    stats = export.sync(db, out, **options)
+    print(f"{label:>12}: {time.perf_counter() - t:6.2f}s  " + "  ".join(
+        f"{name} read {s['read']:5} in {s['pages']:3} pages, {s['rows']:5} rows" for name, s in stats.items()
+    ))
+    return stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="incremental firestore export check")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    args = parser.parse_args(argv)
+
+    db = make_db()
+    journal = tempfile.mkdtemp(prefix="wm-journal-")
+    out = tempfile.mkdtemp(prefix="wm-export-")
+    writer = WriteBehindWriter(db, journal_dir=journal, flush_interval=0.05)
+    options = {"fmt": args.format, "page_size": args.page_size}
+    try:
+        sessions = populate(writer, args.sessions, args.pages)
+        n = args.sessions
+        full = run(db, out, "full", full=True, **options)
+        assert full["sessions"]["rows"] >= n and full["pages"]["rows"] >= n * args.pages
+        again = run(db, out, "unchanged", **options)
+        assert again["sessions"]["read"] == again["pages"]["read"] == 0, "unchanged rerun read documents"
+
+        # a few late demographics updates, and some new sessions
+        for session in sessions[:5]: session.save_demographics({"gender": "m", "age": "26-30"})
+        populate(writer, 10, args.pages)
+        changed = run(db, out, "incremental", **options)
+        assert changed["sessions"]["read"] == 15 and changed["pages"]["read"] == 10 * args.pages, changed
+        assert changed["sessions"]["rows"] == full["sessions"]["rows"] + 10
+
+        rows = {r["path"]: r for r in export._load(export.table_path(out, "sessions", args.format))}
+        assert rows[sessions[0].path]["demographics.gender"] == "m", "update not applied"
+        print("ok")
+    finally:
+        writer.close()
+        shutil.rmtree(out, ignore_errors=True)
+        shutil.rmtree(journal, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import asyncio
+import datetime
+import sys
+import threading
+import time
+import types
+from types import SimpleNamespace
+
+
+# error with an http status, like google.genai.errors.APIError
+class FakeAPIError(Exception):
+    def __init__(self, code: int, status: str):
+        super().__init__(f"{code} {status}")
+        self.code = code
+
+
+def _usage(prompt: str, text: str) -> SimpleNamespace:
+    # ~4 characters per token
+    p, c = len(prompt) // 4, len(text) // 4
+    return SimpleNamespace(prompt_token_count=p, candidates_token_count=c, total_token_count=p + c)
+
+
+# in-process stand-in for google.genai: generate_content echoes the tail of the prompt after a fixed latency.
+# optionally enforces a requests-per-minute quota (429 beyond it, per sliding window of `window` seconds) and simulates outages
+# (503 while down), see bench/quota.py
+class FakeModels:
+    def __init__(self, latency: float = 0.0, response_chars: int | None = None, rpm: int | None = None):
+        self.latency = latency
+        self.response_chars = response_chars
+        self.rpm = rpm
+        self.window = 60.0
+        self.down_until = 0.0
+        self.calls = 0
+        self.rejected = 0
+        self._recent: list[float] = []
+        self._lock = threading.Lock()
+
+    def outage(self, seconds: float):
+        self.down_until = time.monotonic() + seconds
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            if now < self.down_until:
+                self.rejected += 1
+                raise FakeAPIError(503, "UNAVAILABLE")
+            if self.rpm is not None:
+                self._recent = [t for t in self._recent if now - t < self.window]
+                if len(self._recent) >= self.rpm:
+                    self.rejected += 1
+                    raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+                self._recent.append(now)
+
+    def generate_content(self, model: str, contents: str):
+        self._admit()
+        if self.latency: time.sleep(self.latency)
+        text = contents if self.response_chars is None else contents[-self.response_chars:]
+        return SimpleNamespace(text=text, usage_metadata=_usage(contents, text))
+
+
+# async side (client.aio.models), sharing call counts with the sync one
+class FakeAsyncModels:
+    def __init__(self, models: FakeModels):
+        self.sync = models
+
+    async def generate_content(self, model: str, contents: str):
+        self.sync._admit()
+        if self.sync.latency: await asyncio.sleep(self.sync.latency)
+        text = contents if self.sync.response_chars is None else contents[-self.sync.response_chars:]
+        return SimpleNamespace(text=text, usage_metadata=_usage(contents, text))
+
+    async def generate_content_stream(self, model: str, contents: str):
+        response = await self.generate_content(model, contents)
+
+        async def chunks():
+            # usage totals on the last chunk only
+            n = len(response.text)
+            for i in range(0, n, 64):
+                yield SimpleNamespace(
+                    text=response.text[i:i + 64], usage_metadata=response.usage_metadata if i + 64 >= n else None
+                )
+
+        return chunks()
+
+
+class FakeGenaiClient:
+    latency: float = 0.0
+
+    def __init__(self, api_key: str | None = None, **kwargs):
+        self.api_key = api_key
+        self.models = FakeModels(FakeGenaiClient.latency)
+        self.aio = SimpleNamespace(models=FakeAsyncModels(self.models))
+
+
+def install_fake_genai(latency: float = 0.0):
+    # must run before script (or anything else importing google.genai) is imported
+    FakeGenaiClient.latency = latency
+    genai = types.ModuleType("google.genai")
+    genai.Client = FakeGenaiClient
+    try:
+        import google
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.genai = genai
+    sys.modules["google.genai"] = genai
+    return genai
+
+
+# in-process stand-in for a firestore client, covering the calls SurveySession makes and the paged,
+# partitioned collection group queries of export.py
+class FakeDocument:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def set(self, data: dict, merge: bool = False):
+        self.db.round_trip()
+        with self.db.lock:
+            self.db.write(self.path, data, merge=merge)
+
+    def update(self, data: dict):
+        self.db.round_trip()
+        with self.db.lock:
+            if self.path not in self.db.docs: raise KeyError(f"No document to update: {self.path}")
+            self.db.write(self.path, data, merge=True)
+
+    def get(self):
+        self.db.round_trip()
+        with self.db.lock:
+            return self.db.snapshot(self.path)
+
+
+class FakeCollection:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self.db = db
+        self.path = path
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self.db, f"{self.path}/{doc_id}")
+
+
+class NotFound(Exception):
+    # as google.api_core.exceptions.NotFound, e.g. an update of a missing document
+    pass
+
+
+class FakeBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref: FakeDocument, data: dict, merge: bool = False):
+        self.ops.append(("set", ref, data, merge))
+
+    def update(self, ref: FakeDocument, data: dict):
+        self.ops.append(("update", ref, data, False))
+
+    def commit(self):
+        self.db.round_trip()
+        with self.db.lock:
+            # all or nothing, as firestore
+            written = set()
+            for op, ref, _, _ in self.ops:
+                if op == "update" and ref.path not in self.db.docs and ref.path not in written:
+                    raise NotFound(f"No document to update: {ref.path}")
+                written.add(ref.path)
+            for op, ref, data, merge in self.ops:
+                self.db.write(ref.path, data, merge=op == "update" or merge)
+        self.ops = []
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeFirestore", group: str, filters=(), order=(), limit=None, after=None, bounds=None):
+        self.db = db
+        self.group = group
+        self.filters = filters
+        self.order = order
+        self._limit = limit
+        self.after = after
+        # [start, end) of document paths, for partitions
+        self.bounds = bounds
+
+    def _copy(self, **changes) -> "FakeQuery":
+        q = FakeQuery(self.db, self.group, self.filters, self.order, self._limit, self.after, self.bounds)
+        for k, v in changes.items(): setattr(q, k, v)
+        return q
+
+    def where(self, filter):
+        return self._copy(filters=(*self.filters, filter))
+
+    def order_by(self, field: str):
+        return self._copy(order=(*self.order, field))
+
+    def limit(self, n: int):
+        return self._copy(_limit=n)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def _key(self, snapshot) -> tuple:
+        return tuple(snapshot.get(f) for f in self.order if f != "__name__") + (snapshot.reference.path,)
+
+    def stream(self):
+        ops = {">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "<": lambda a, b: a < b, "==": lambda a, b: a == b}
+        self.db.round_trip()
+        with self.db.lock:
+            snapshots = [
+                self.db.snapshot(path) for path in self.db.docs
+                if path.split("/")[-2] == self.group
+                and (self.bounds is None or self.bounds[0] <= path < self.bounds[1])
+            ]
+        # like firestore, a filter or order on a field leaves out documents without it
+        fields = {f.field_path for f in self.filters} | {f for f in self.order if f != "__name__"}
+        snapshots = [s for s in snapshots if all(f in s.data for f in fields)]
+        snapshots = [s for s in snapshots if all(ops[f.op_string](s.get(f.field_path), f.value) for f in self.filters)]
+        snapshots.sort(key=self._key)
+        if self.after is not None:
+            after = self._key(self.after)
+            snapshots = [s for s in snapshots if self._key(s) > after]
+        return iter(snapshots[:self._limit])
+
+    def get_partitions(self, partition_count: int):
+        with self.db.lock:
+            paths = sorted(p for p in self.db.docs if p.split("/")[-2] == self.group)
+        step = max(1, -(-len(paths) // partition_count))
+        cuts = ["", *paths[step::step], "\uffff"]
+        for start, end in zip(cuts, cuts[1:]):
+            yield SimpleNamespace(query=lambda start=start, end=end: self._copy(order=("__name__",), bounds=(start, end)))
+
+
+class FakeFirestore:
+    SERVER_TIMESTAMP = object()
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.docs: dict[str, dict] = {}
+        self.update_times: dict[str, datetime.datetime] = {}
+        self.round_trips = 0
+        self.lock = threading.Lock()
+        self._now = datetime.datetime.now(datetime.timezone.utc)
+
+    def write(self, path: str, data: dict, merge: bool = False):
+        # under lock. commit times are strictly increasing, and replace SERVER_TIMESTAMP
+        self._now = max(self._now + datetime.timedelta(microseconds=1), datetime.datetime.now(datetime.timezone.utc))
+        data = {k: self._now if v is FakeFirestore.SERVER_TIMESTAMP else v for k, v in data.items()}
+        if merge: self.docs.setdefault(path, {}).update(data)
+        else: self.docs[path] = data
+        self.update_times[path] = self._now
+
+    def snapshot(self, path: str) -> SimpleNamespace:
+        # under lock
+        data = self.docs.get(path)
+        data = dict(data) if data is not None else None
+        return SimpleNamespace(
+            id=path.rsplit("/", 1)[-1], reference=SimpleNamespace(path=path), exists=data is not None,
+            data=data or {}, to_dict=lambda: dict(data) if data is not None else None,
+            get=lambda field: (data or {}).get(field), update_time=self.update_times.get(path),
+        )
+
+    def collection_group(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+        if self.latency: time.sleep(self.latency)
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def document(self, path: str) -> FakeDocument:
+        return FakeDocument(self, path)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+
+# minimal stand-ins for the tk objects DetectPage.response touches, so it can run without a display
+class FakeVar:
+    def __init__(self, value=None):
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class InlineApp:
+    def after(self, ms: int, fn=None, *args):
+        if fn: fn(*args)
+
+    def after_idle(self, fn, *args):
+        fn(*args)
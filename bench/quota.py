@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from bench.fakes import FakeGenaiClient
+from services.llm import AsyncLLMClient
+from services.quota import CircuitBreaker, QuotaScheduler
+
+# AsyncLLMClient flow control against the in-process fake endpoint (bench.fakes):
+# - quota: the fake allows --rpm requests per (shortened) minute of --minute-s; a client that knows the quota
+#   paces itself, one that doesn't runs into 429s and relies on the shared cool-down and its retries
+# - outage: the fake is down for --outage-s; with the circuit breaker callers fail fast, without it every
+#   request keeps retrying against the dead endpoint
+# usage: python -m bench.quota [--rpm 120] [--minute-s 5] [--requests 300] [--outage-s 8]
+
+
+def make_client(quota: QuotaScheduler, breaker: CircuitBreaker) -> AsyncLLMClient:
+    client = FakeGenaiClient()
+    client.models.latency = 0.02
+    return AsyncLLMClient(client, "fake", max_concurrency=quota.max_concurrency, quota=quota, breaker=breaker)
+
+
+async def timed(llm: AsyncLLMClient, q: str) -> tuple[bool, float]:
+    t = time.perf_counter()
+    try:
+        await llm.generate(q)
+        return True, time.perf_counter() - t
+    except Exception:
+        return False, time.perf_counter() - t
+
+
+def run(llm: AsyncLLMClient, requests: int, spacing: float) -> tuple[int, float, float]:
+    async def send():
+        tasks = []
+        for i in range(requests):
+            tasks.append(asyncio.ensure_future(timed(llm, f"request {i}")))
+            if spacing: await asyncio.sleep(spacing)
+        return await asyncio.gather(*tasks)
+
+    t = time.perf_counter()
+    # the client logs every prompt
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run_coroutine_threadsafe(send(), llm.loop).result()
+    ok = sum(r[0] for r in results)
+    mean_wait = sum(r[1] for r in results) / len(results)
+    return ok, mean_wait, time.perf_counter() - t
+
+
+def run_quota(rpm: int, minute: float, requests: int, aware: bool):
+    # the scheduler counts real minutes, the fake counts shortened ones
+    quota = QuotaScheduler(16, rpm=rpm * 60 / minute if aware else None)
+    llm = make_client(quota, CircuitBreaker(failure_threshold=1 << 30))
+    llm.client.models.rpm = rpm
+    llm.client.models.window = minute
+    ok, mean_wait, total = run(llm, requests, 0)
+    models = llm.client.models
+    print(
+        f"quota {'aware' if aware else 'blind'}: {ok}/{requests} ok, {models.calls} upstream calls "
+        f"({models.rejected} 429s), mean wait {mean_wait:5.2f}s, total {total:5.1f}s, {quota.stats()}"
+    )
+    llm.close()
+
+
+def run_outage(outage: float, requests: int, breaker: bool):
+    threshold = 3 if breaker else 1 << 30
+    llm = make_client(QuotaScheduler(16), CircuitBreaker(failure_threshold=threshold, reset_timeout=2.0))
+    llm.client.models.outage(outage)
+    # one request every 50ms, all of them during the outage
+    ok, mean_wait, total = run(llm, requests, 0.05)
+    models = llm.client.models
+    print(
+        f"outage, breaker {'on ' if breaker else 'off'}: {ok}/{requests} ok, {models.calls} upstream calls "
+        f"({models.rejected} 503s), mean wait {mean_wait:5.2f}s, total {total:5.1f}s, {llm.breaker.stats()}"
+    )
+    llm.close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="llm quota scheduler / circuit breaker check")
+    parser.add_argument("--rpm", type=int, default=120)
+    parser.add_argument("--minute-s", type=float, default=5.0)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--outage-s", type=float, default=8.0)
+    args = parser.parse_args(argv)
+
+    for aware in (False, True):
+        run_quota(args.rpm, args.minute_s, args.requests, aware)
+    for breaker in (False, True):
+        run_outage(args.outage_s, 100, breaker)
+
+
+if __name__ == "__main__":
+    main()
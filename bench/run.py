@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable
+
+import yaml
+
+from bench.fakes import install_fake_genai, FakeFirestore, FakeVar, InlineApp
+from services.resources import data_dir_path
+
+# reproducible benchmarks for the watermark, detection and persistence hot paths.
+# runs headless: gemini and firestore are replaced by in-process fakes (see bench/fakes.py).
+# usage: python -m bench.run [--sizes 1K,10K,...] [--out bench_output.txt] [--json]
+
+default_sizes = ["1K", "10K", "100K", "1M", "10M"]
+char_mark_names = ["upper", "space#", "ab", "phishing", "space-replace"]
+
+
+def parse_size(s: str) -> int:
+    units = {"K": 1 << 10, "M": 1 << 20}
+    s = s.strip().upper()
+    return int(s[:-1]) * units[s[-1]] if s[-1] in units else int(s)
+
+
+def make_text(size: int, seed: int) -> str:
+    # word salad drawn from the bundled data files, so letter/space frequencies look like real responses
+    words = []
+    for name in ("questions.txt", "introduction.txt", "terms.txt"):
+        with open(data_dir_path + name, "rt", encoding="utf-8") as f:
+            words.extend(f.read().split())
+    rnd = random.Random(seed)
+    out, n = [], 0
+    while n < size:
+        w = rnd.choice(words)
+        out.append(w)
+        n += len(w) + 1
+    return " ".join(out)[:size]
+
+
+def measure(fn: Callable[[], object], size: int, min_runs: int, budget: float) -> dict:
+    fn()  # warm up
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_runs or (time.perf_counter() - start < budget and len(times) < 1000):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    mean = statistics.fmean(times)
+    return {
+        "runs": len(times),
+        "p50_ms": times[len(times) // 2] * 1e3,
+        "p99_ms": times[min(len(times) - 1, int(len(times) * 0.99))] * 1e3,
+        "mb_per_s": size / mean / (1 << 20) if mean else float("inf"),
+    }
+
+
+def load_script(acrostic_latency: float):
+    # import script against a throwaway config and the fake gemini client
+    install_fake_genai(latency=acrostic_latency)
+    conf = {
+        "genai_api_key": "bench",
+        "watermarks": list(char_mark_names),
+        "acrostic": {"mark": "BENCH", "position": "the start of every sentence"},
+        "cache": {"dir": tempfile.mkdtemp(prefix="wm-bench-cache-")},
+    }
+    fd, path = tempfile.mkstemp(suffix=".yml")
+    with os.fdopen(fd, "wt") as f:
+        yaml.safe_dump(conf, f)
+    os.environ["WM_CONFIG_PATH"] = path
+    import script
+    return script
+
+
+def set_active(script, names: list[str]):
+    script.config["watermarks"] = names
+    script.pipeline = script.WatermarkPipeline(script.active_watermarks().values())
+
+
+def bench_detect_response(mark, text: str):
+    from services.telemetry import EventRecorder
+    from services.tracing import untraced
+    from ui.detect import DetectPage
+    from ui.scheduler import Scheduler
+
+    # DetectPage.response on a stand-in page: measures the worker hop + watermarking up to the final UI callback
+    done = threading.Event()
+
+    def set_response_text(t, user_response_enabled=False):
+        if user_response_enabled: done.set()
+
+    app = InlineApp()
+    app.scheduler = Scheduler(app, workers=1)
+    page = SimpleNamespace(
+        mark=mark, app=app, _stream_mark=None, _stream_chunks=0,
+        set_response_text=set_response_text, trace=untraced, telemetry=EventRecorder(),
+        is_wm_yes_var=FakeVar(), is_wm_no_var=FakeVar(), _response_correctness_var=FakeVar(),
+    )
+
+    def run():
+        done.clear()
+        DetectPage.response(page, text)
+        done.wait()
+
+    return run
+
+
+def bench_save_question(db_latency: float, text: str):
+    from services.survey import SurveySession
+
+    session = SurveySession(db=FakeFirestore(latency=db_latency), user_id="bench")
+    data = {
+        "t": 42,
+        "question": "bench question",
+        "user_query": "bench query",
+        "model_response": text,
+        "user_survey": {"is_wm": True, "reasoning": "r" * 40, "text_edited": text, "edited_action": "a" * 40},
+    }
+    counter = iter(range(1 << 30))
+    return lambda: session.save_question(next(counter), data)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="watermark / detection / persistence benchmarks")
+    parser.add_argument("--sizes", default=",".join(default_sizes))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per measurement")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--out", default="bench_output.txt")
+    parser.add_argument("--json", action="store_true", help="write json lines instead of a table")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    script = load_script(args.llm_latency_ms / 1e3)
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    results = []
+
+    def record(case: str, size: int, r: dict, **extra):
+        row = {"case": case, "size": size, **extra, **r}
+        results.append(row)
+        print(f"{case:<32} {size:>10} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['mb_per_s']:>10.1f}", file=sys.stderr)
+
+    # stubborn_generation prints every prompt; keep that out of the timings
+    with open(os.devnull, "wt") as devnull, contextlib.redirect_stdout(devnull):
+        for size in sizes:
+            text = make_text(size, args.seed)
+            # apply_watermarks, sweeping the number of active char marks
+            for n in range(1, len(char_mark_names) + 1):
+                set_active(script, char_mark_names[:n])
+                record(f"apply_watermarks[{n}]", size, measure(
+                    lambda: script.apply_watermarks(text), size, args.min_runs, args.budget
+                ), marks=n)
+            set_active(script, list(char_mark_names))
+            # individual marks
+            for name, mark in script.active_watermarks().items():
+                record(f"mark[{name}]", size, measure(lambda: mark(text), size, args.min_runs, args.budget))
+            acrostic = script.marks["acrostic"]
+            record("mark[acrostic]", size, measure(lambda: acrostic(text), size, args.min_runs, args.budget))
+            record("mark[acrostic, uncached]", size, measure(
+                lambda: acrostic.mark(text), size, args.min_runs, args.budget
+            ))
+            # detectors
+            from services import detection
+            for name, scorer in detection.scorers.items():
+                record(f"detect[{name}]", size, measure(lambda: scorer([text]), size, args.min_runs, args.budget))
+            # ui + persistence paths
+            record("DetectPage.response", size, measure(
+                bench_detect_response(script.marks["upper"][0], text), size, args.min_runs, args.budget
+            ))
+            record("SurveySession.save_question", size, measure(
+                bench_save_question(args.db_latency_ms / 1e3, text), size, args.min_runs, args.budget
+            ))
+
+    with open(args.out, "wt", encoding="utf-8") as f:
+        if args.json:
+            for row in results:
+                f.write(json.dumps(row) + "\n")
+        else:
+            f.write(f"# seed={args.seed} db_latency_ms={args.db_latency_ms} llm_latency_ms={args.llm_latency_ms}\n")
+            f.write(f"{'case':<32} {'bytes':>10} {'p50 ms':>10} {'p99 ms':>10} {'MB/s':>10} {'runs':>6}\n")
+            for row in results:
+                f.write(
+                    f"{row['case']:<32} {row['size']:>10} {row['p50_ms']:>10.3f} {row['p99_ms']:>10.3f}"
+                    f" {row['mb_per_s']:>10.1f} {row['runs']:>6}\n"
+                )
+    print(f"wrote {len(results)} results to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import time
+
+from bench.fakes import FakeFirestore
+from services.writer import WriteBehindWriter
+from services.survey import SurveySession
+
+# compares blocking vs write-behind SurveySession saves, and checks every write arrives.
+# runs against the in-process fake by default, or the firestore emulator when FIRESTORE_EMULATOR_HOST is set:
+#   gcloud emulators firestore start --host-port=localhost:8080
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m bench.writer
+# usage: python -m bench.writer [--pages 20] [--db-latency-ms 50]
+
+
+def make_db(latency: float):
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore
+        return firestore.Client(project=os.environ.get("GCLOUD_PROJECT", "demo-cs-f-wm"))
+    return FakeFirestore(latency=latency)
+
+
+def run(db, writer: WriteBehindWriter | None, pages: int) -> tuple[float, float, SurveySession]:
+    t0 = time.perf_counter()
+    session = SurveySession(db=db, user_id="bench", writer=writer)
+    worst = 0.0
+    for i in range(pages):
+        t = time.perf_counter()
+        session.save_question(i, {"t": i, "question": "q", "model_response": "r" * 2000, "user_survey": {"is_wm": False}})
+        worst = max(worst, time.perf_counter() - t)
+    session.save_demographics({"age": None})
+    if writer: writer.flush()
+    return time.perf_counter() - t0, worst, session
+
+
+def verify(db, session: SurveySession, pages: int):
+    doc = db.document(session.path).get()
+    assert doc.exists and doc.to_dict().get("user_id") == "bench", "session document missing"
+    assert "demographics" in doc.to_dict(), "demographics missing"
+    for i in range(pages):
+        assert db.document(f"{session.path}/pages/{i}").get().exists, f"page {i} missing"
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="SurveySession write-behind check")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    db = make_db(args.db_latency_ms / 1e3)
+    total, worst, session = run(db, None, args.pages)
+    verify(db, session, args.pages)
+    print(f"blocking:     total {total * 1e3:8.1f} ms, worst save on caller {worst * 1e3:8.2f} ms")
+
+    writer = WriteBehindWriter(db, journal_dir=tempfile.mkdtemp(prefix="wm-journal-"), flush_interval=0.05)
+    total, worst, session = run(db, writer, args.pages)
+    verify(db, session, args.pages)
+    print(f"write-behind: total {total * 1e3:8.1f} ms, worst save on caller {worst * 1e3:8.2f} ms, "
+          f"{writer.commits} commits")
+    writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import json
+import sys
+import time
+
+from services.diff import diff_batch
+
+# how participants edited the marked text, for every page of an export (export.py) or a jsonl of page records:
+#   python edits.py results/pages.parquet -o edits.jsonl
+# one line per page with an edited text: its path / assignment, the char and word edit distances between
+# model_response and user_survey.text_edited, the edit op counts, and per char mark the edited chars that
+# undo that mark's artifacts vs other changes (services/diff.py). pages are spread over a process pool.
+
+
+def _get(record: dict, key: str):
+    # flattened (export.py) or nested (page documents)
+    if key in record: return record[key]
+    for part in key.split("."):
+        if not isinstance(record, dict): return None
+        record = record.get(part)
+    return record
+
+
+def load(path: str) -> list[dict]:
+    if path.endswith(".parquet") or path.endswith(".arrow"):
+        import pyarrow.parquet as pq
+        import pyarrow.feather as feather
+        table = pq.read_table(path) if path.endswith(".parquet") else feather.read_table(path)
+        return table.to_pylist()
+    src = sys.stdin if path == "-" else open(path, "rt", encoding="utf-8")
+    try:
+        return [json.loads(line) for line in src if line.strip()]
+    finally:
+        if src is not sys.stdin: src.close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="edit analysis of model_response vs text_edited")
+    parser.add_argument("input", help="pages table (.parquet / .arrow from export.py) or jsonl, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output jsonl, - for stdout")
+    parser.add_argument("--marks", nargs="+", help="char marks to attribute edits to (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: cpu count)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    pages = [
+        p for p in load(args.input)
+        if isinstance(_get(p, "model_response"), str) and isinstance(_get(p, "user_survey.text_edited"), str)
+    ]
+    results = diff_batch(
+        ((_get(p, "model_response"), _get(p, "user_survey.text_edited")) for p in pages),
+        args.marks, args.workers,
+    )
+    dst = sys.stdout if args.output == "-" else open(args.output, "wt", encoding="utf-8")
+    try:
+        for p, r in zip(pages, results):
+            record = {
+                "path": _get(p, "path"),
+                "mark": _get(p, "assignment.mark"),
+                "marked": _get(p, "assignment.marked"),
+                **r,
+            }
+            dst.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if dst is not sys.stdout: dst.close()
+    print(f"edits: {len(pages)} pages in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.writer import updated_field
+
+# incremental firestore -> columnar export for analysis:
+#   python export.py results/                       # parquet, only what changed since the last run
+#   python export.py results/ --format arrow --full
+# writes one table per collection group: sessions (responses/{session}, demographics flattened in) and pages
+# (responses/{session}/pages/{i}, user_survey and assignment flattened in). nested dicts become dotted columns,
+# lists json strings, the packed telemetry stays binary.
+# the cursor (cursor.json in the output dir) is the latest commit time seen per table; later runs only query
+# documents whose updated_at (stamped by the write-behind writer) is newer, and upsert them by path.
+# documents written before updated_at existed have no such field: they come with the first (or a --full) run.
+# the incremental query filters and orders a collection group on updated_at, which needs a collection group
+# scope index on the field (firestore only indexes single fields per collection by default). it is declared in
+# firestore.indexes.json (the override lists the field's default per collection indexes too, as it replaces
+# them), deploy it once per project with `firebase deploy --only firestore:indexes`; without it
+# the query fails with FAILED_PRECONDITION. the emulator needs no index.
+# a full run reads each table as parallel partitions; every read is paged.
+# works against the firestore emulator as is (FIRESTORE_EMULATOR_HOST), see bench/export.py.
+
+tables = {"sessions": "responses", "pages": "pages"}
+
+
+def _flatten(data: dict, prefix: str = "", row: dict | None = None) -> dict:
+    row = {} if row is None else row
+    for k, v in data.items():
+        if isinstance(v, dict): _flatten(v, f"{prefix}{k}.", row)
+        elif isinstance(v, (list, tuple)): row[prefix + k] = json.dumps(v, default=str)
+        else: row[prefix + k] = v
+    return row
+
+
+def _row(snapshot) -> dict:
+    path = snapshot.reference.path
+    parts = path.split("/")
+    row = {"path": path, "session_id": parts[1]}
+    _flatten(snapshot.to_dict() or {}, row=row)
+    # the commit time itself, also for documents without the field
+    row[updated_field] = snapshot.update_time
+    return row
+
+
+def _paged(query, page_size: int):
+    # the query in pages of page_size, each resuming after the last document of the previous one
+    last = None
+    while True:
+        q = query.limit(page_size)
+        if last is not None: q = q.start_after(last)
+        docs = list(q.stream())
+        yield docs
+        if len(docs) < page_size: return
+        last = docs[-1]
+
+
+def _read(query, page_size: int) -> tuple[list[dict], int]:
+    rows, pages = [], 0
+    for docs in _paged(query, page_size):
+        pages += 1
+        rows.extend(_row(d) for d in docs)
+    return rows, pages
+
+
+def _queries(db, group: str, cursor: datetime.datetime | None, workers: int) -> list:
+    collection = db.collection_group(group)
+    if cursor is not None:
+        from google.cloud.firestore import FieldFilter
+        return [collection.where(filter=FieldFilter(updated_field, ">", cursor)).order_by(updated_field)]
+    try:
+        partitions = [p.query() for p in collection.get_partitions(workers)]
+    except Exception as e:
+        # e.g. not supported by an older emulator: one sequential scan
+        print(f"export: no partitions for {group} ({e}), reading sequentially", file=sys.stderr)
+        partitions = []
+    return partitions or [collection.order_by("__name__")]
+
+
+def table_path(out_dir: str, name: str, fmt: str = "parquet") -> str:
+    return os.path.join(out_dir, f"{name}.{'parquet' if fmt == 'parquet' else 'arrow'}")
+
+
+def _load(path: str) -> list[dict]:
+    if not os.path.exists(path): return []
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    table = pq.read_table(path) if path.endswith(".parquet") else feather.read_table(path)
+    return table.to_pylist()
+
+
+def _save(path: str, rows: list[dict]):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    # columns from every row (from_pylist would only look at the first), missing values null
+    columns = dict.fromkeys(k for r in rows for k in r)
+    table = pa.table({k: [r.get(k) for r in rows] for k in columns})
+    tmp = path + ".tmp"
+    if path.endswith(".parquet"): pq.write_table(table, tmp)
+    else: feather.write_feather(table, tmp)
+    os.replace(tmp, path)
+
+
+def _load_cursor(path: str) -> dict[str, datetime.datetime]:
+    try:
+        with open(path, "rt") as f:
+            return {k: datetime.datetime.fromisoformat(v) for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def _save_cursor(path: str, cursor: dict[str, datetime.datetime]):
+    tmp = path + ".tmp"
+    with open(tmp, "wt") as f:
+        json.dump({k: v.isoformat() for k, v in cursor.items()}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def sync(
+        db, out_dir: str, fmt: str = "parquet", workers: int = 8, page_size: int = 500, full: bool = False
+) -> dict[str, dict]:
+    # per table: {"read": documents fetched, "pages": query pages, "rows": rows in the table}
+    os.makedirs(out_dir, exist_ok=True)
+    cursor_path = os.path.join(out_dir, "cursor.json")
+    cursor = {} if full else _load_cursor(cursor_path)
+
+    # every query (of both tables) on one pool
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reads = {
+            name: [pool.submit(_read, q, page_size) for q in _queries(db, group, cursor.get(name), workers)]
+            for name, group in tables.items()
+        }
+        results = {name: [f.result() for f in futures] for name, futures in reads.items()}
+
+    stats = {}
+    for name, parts in results.items():
+        changed = [r for rows, _ in parts for r in rows]
+        path = table_path(out_dir, name, fmt)
+        if changed or full:
+            paths = {r["path"] for r in changed}
+            kept = [] if full else [r for r in _load(path) if r["path"] not in paths]
+            rows = sorted(kept + changed, key=lambda r: r["path"])
+            _save(path, rows)
+        else:
+            rows = _load(path)
+        stamps = [r[updated_field] for r in changed if r[updated_field] is not None]
+        if stamps: cursor[name] = max(stamps + ([cursor[name]] if name in cursor else []))
+        stats[name] = {"read": len(changed), "pages": sum(p for _, p in parts), "rows": len(rows)}
+    # only once the tables are written: a crash in between means re-reading, never missing documents
+    _save_cursor(cursor_path, cursor)
+    return stats
+
+
+def make_db():
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore
+        return firestore.Client(project=os.environ.get("GCLOUD_PROJECT", "demo-cs-f-wm"))
+    from services import firebase
+    return firebase.init_db()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="export study results from firestore to parquet / arrow",
+        epilog="incremental runs (without --full) query the responses and pages collection groups on updated_at, "
+               "which needs the collection group index in firestore.indexes.json: "
+               "firebase deploy --only firestore:indexes",
+    )
+    parser.add_argument("output", help="output directory (tables and sync cursor)")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--full", action="store_true", help="ignore the cursor, re-read everything (needs no index)")
+    parser.add_argument("--workers", type=int, default=8, help="parallel reads (partitions of a full read)")
+    parser.add_argument("--page-size", type=int, default=500, help="documents per query page")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = sync(make_db(), args.output, args.format, args.workers, args.page_size, args.full)
+    for name, s in stats.items():
+        print(f"export: {name}: {s['read']} documents read in {s['pages']} pages, {s['rows']} rows", file=sys.stderr)
+    print(f"export: done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,121 @@
+from services import startup
+
+startup.begin()
+
+import functools
 import os
-import random
 import sys
-import threading
 from os import system
 from tkinter import ttk
 from tkinter.font import Font
 from typing import Callable
 
-import certifi
 import yaml
-from google import genai
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_message
 
+# heavy modules (google.genai, firebase_admin, google auth, tenacity, numpy) are imported on first use only
 from services import firebase
+from services.assignment import AssignmentEngine
+from services.questions import QuestionBank
+from services.resources import data_dir_path
+from services.survey import SurveySession
+from services.writer import WriteBehindWriter, default_journal_dir
+from services.marks import Detector, build_marks, create_cache, create_llm
+from services.tracing import Trace, untraced
+from services.watermark import Watermark, WatermarkPipeline
 from ui.demo import DemoPage
 from ui.app import App, WidgetFrame
-from ui.app import data_dir_path
 from ui.auth import TermsPage, AuthPage
 from ui.detect import DetectPage
-from ui.survey import PagedFrame, SurveySession
-
-Watermark = Callable[[str], str]
-Detector = Callable[[str], float]
+from ui.scheduler import CancelToken
+from ui.survey import PagedFrame
 
 config = {}
+config_path = os.environ.get("WM_CONFIG_PATH", data_dir_path + "config.yml")
 try:
-    with open(data_dir_path + "config.yml", 'rt+') as f:
+    with open(config_path, 'rt+') as f:
         config = yaml.safe_load(f)
 except OSError as e:
     print(e)
     input("Could not load config.")
     exit(1)
-acrostic_config: dict[str, str] = config['acrostic']
-
-marks: dict[str, Watermark | tuple[Watermark, Detector]] = {
-    "upper": lambda s: s.upper(),
-    "space#": lambda s: s.replace(' ', '#'),
-    "ab": lambda s: s.replace('A', 'B').replace('a', 'b'),
-    "phishing": lambda s: s.replace("m", "rn"),
-    "space-replace": lambda s: s.replace(' ', random.choice(['\u2004', '\u2005', '\u2006', '\u2007', '\u2008'])),
-    "acrostic": lambda s: stubborn_generation(
-        "consider the poem technique of \'acrostic\', where the leading letters of sentence in the poem "
-        "combine sequentially to create a secret hidden message.\n"
-        "Bellow, you are given a piece of text. As an assistant, your task is to rephrase the text such that the letters at "
-        + acrostic_config['position'] +
-        " ends up spelling the secret word:\n"
-        + acrostic_config['mark'] +
-        "\n\n"
-        "* The letters must be hidden! No formatting (bold, italic, letter isolation, etc.) should be added "
-        "that may draw attention to the hidden word "
-        + acrostic_config['mark'] +
-        ".\n"
-        "* The letters must be correct! Make sure that you've rephrased the text properly- such that"
-        " the letters EXACTLY at "
-        + acrostic_config['position'] +
-        " in the new text, when added in isolation one after the other do indeed make out the secret word.\n"
-        "* The position is crucial! Be extremely diligent and ensure the words in that exact position of "
-        + acrostic_config['position'] +
-        " is where the letters add up - ensure that you aren't differing by "
-        "a word or a letter or missing a letter. Rephrase as much as necessary to achieve this.\n"
-        "Do your best to keep the original meaning of the text, and try to keep any "
-        "special formatting, line breaks or spacing the original text has.\n"
-        "Once the full word is fully embedded in "
-        + acrostic_config['position'] +
-        ", do not repeat the letters of the word and simply keep the rest of the text as is.\n"
-        "\n"
-        "Do not respond to this query with anything other than the modified text and only it.\n"
-        "Do NOT add any formatting that may highlight or draw attention towards the hidden letters, "
-        "such as isolating them with symbols or uppercasing them.\n"
-        "Respond only with the modified text.\n"
-        "Here below is the original text:"
-        "\n\n\n"
-        + s
-    ).text
-}
-
-
-def active_watermarks() -> dict[str, Watermark | tuple[Watermark, Detector]]:
+
+# one event loop thread owns all gemini calls: bounded concurrency, identical in-flight prompts coalesced
+llm = create_llm(config)
+
+# every mark goes through the output cache; identical (mark, config, text) is a lookup instead of a recompute
+watermark_cache = create_cache(config)
+marks: dict[str, Watermark | tuple[Watermark, Detector]] = build_marks(config, llm, watermark_cache)
+
+
+def active_detectors() -> dict[str, Detector]:
+    return {k: v[1] for k, v in marks.items() if k in config['watermarks'] and isinstance(v, tuple)}
+
+
+def active_watermarks() -> dict[str, Watermark]:
     return {
         k:
-            v[0] if type(v) == tuple[Watermark, Detector]
+            v[0] if isinstance(v, tuple)
             else v
         for k, v in marks.items() if k in config['watermarks']
     }
 
 
+# built once from config['watermarks']; char-level marks are fused into a single pass
+pipeline = WatermarkPipeline(active_watermarks().values())
+
+
 def apply_watermarks(text: str):
-    t = text
-    for (_, mark) in active_watermarks().items():
-        t = mark(t)
-    return t
+    return pipeline(text)
 
 
-os.environ["SSL_CERT_FILE"] = certifi.where()
-client = genai.Client(api_key=config['genai_api_key'])
-model = "gemini-flash-latest"
+def apply_watermarks_batch(texts: list[str]) -> list[str]:
+    return pipeline.apply_batch(texts)
 
 
-@retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential_jitter(initial=1, max=10),
-    retry=retry_if_exception_message(match=r"overloaded|503"),
-)
 def stubborn_generation(q: str):
-    print(f"querying:\n\"{q}\"")
-    return client.models.generate_content(model=model, contents=q)
+    # blocking; for worker threads (e.g. watermarking), retries happen inside the llm client
+    return llm.generate_sync(q)
+
+
+def threaded_stream_query(
+        q: str,
+        chunk_callback: Callable[[str], None],
+        response_callback: Callable[[str, bool], None],
+        key=None, trace: Trace = untraced
+):
+    token: CancelToken | None = None
+
+    def on_chunk(t: str):
+        # chunks of a superseded query are dropped
+        root.after(0, lambda: token is not None and not token.cancelled and chunk_callback(t))
+
+    # full text last, after all chunks. a newer query under the same key supersedes this one
+    token = root.scheduler.attach(
+        llm.submit_stream(q, on_chunk, trace), key=("query", key) if key is not None else None,
+        on_done=lambda resp: response_callback(resp, True),
+        on_error=lambda e: response_callback(f"Error: {e}", False),
+    )
+
+
+def threaded_query(q: str, response_callback: Callable[[str, bool], None], key=None, trace: Trace = untraced):
+    # runs on the llm loop so UI doesn't freeze, results are delivered on the tk thread
+    root.scheduler.attach(
+        llm.submit(q, trace), key=("query", key) if key is not None else None,
+        on_done=lambda resp: response_callback(resp.text, True),
+        on_error=lambda e: response_callback(f"Error: {e}", False),
+    )
 
 
-def threaded_query(q: str, response_callback: Callable[[str, bool], None]):
-    def worker():
-        try:
-            resp = stubborn_generation(q).text
-            ok = True
-        except Exception as e:
-            resp = f"Error: {e}"
-            ok = False
+@functools.cache
+def question_bank() -> QuestionBank:
+    # memory-mapped with a prebuilt index, opened once per process instead of read on every login
+    return QuestionBank(data_dir_path + "questions.txt")
 
-        # update UI safely from main thread
-        root.after(0, lambda: response_callback(resp, ok))
 
-    # run worker in background so UI doesn't freeze
-    threading.Thread(target=worker, daemon=True).start()
+@functools.cache
+def session_writer() -> WriteBehindWriter:
+    # one writer (and journal) per process, shared by every login
+    return WriteBehindWriter(firebase.prewarm, journal_dir=config.get('journal_dir', default_journal_dir))
 
 
 def start_user_ui(uuid: str, username: str):
@@ -145,43 +140,48 @@ def start_user_ui(uuid: str, username: str):
     pager.add_page(intro_frame, "Introduction")
 
     try:
-        with open(data_dir_path + "questions.txt", "rt", encoding='utf-8') as f:
-            questions: list[str] = f.readlines()
+        questions = question_bank()
     except OSError as e:
         print(e)
         input("Could not load questions.")
         exit(1)
 
-    m: list = []
-    for am in active_watermarks().items(): m.append(am)
-
     mark_prob = 1.0
 
     # random.shuffle(m)
     # for i, (name, wm) in enumerate(m):
     #     detect_page = DetectPage(root, pager.notebook, watermark=wm, mark_prob=mark_prob, questions=questions)
     #     detect_page.on_submit = lambda q, page=detect_page: threaded_query(q.strip(), page.response)
-    #     pager.add_page(detect_page, title=f"Page {i+1}", validator=detect_page.validate)
+    #     pager.add_page(detect_page, title=f"Page {i+1}", validator=detect_page.is_valid)
 
-    (name, mark) = random.choice(m)  # todo: use hash with user id
-    # print(name)
+    # (mark, question, marked) per page from a hash of the user id: installs share no counter, so the mark x
+    # question cells are balanced only in expectation
+    marks_active = active_watermarks()
+    assigner = AssignmentEngine(
+        list(marks_active.keys()), len(questions), mark_prob=mark_prob, seed=config.get('assignment_seed', "")
+    )
 
-    db = firebase.init_db()  # long call
-    session = SurveySession(db=db, user_id=uuid)
+    # firebase has been initializing in the background since launch; the writer waits for it on its own thread.
+    # page/demographics saves are journaled locally and committed in batches off the tk thread
+    session = SurveySession(db=None, user_id=uuid, writer=session_writer())
 
     page_amount = 1
     for i in range(page_amount):
+        a = assigner.assign(uuid, page=i)
+        # print(a)
         detect_page = DetectPage(
             root, pager.notebook,
             title=f"Assignment {i + 1}",
-            watermark=mark, mark_prob=mark_prob,
-            questions=questions
+            watermark=marks_active[a.mark], marked=a.marked,
+            question=questions[a.question]
+        )
+        detect_page.on_submit = lambda q, page=detect_page: threaded_stream_query(
+            q.strip(), page.response_chunk, page.response, key=page, trace=page.trace
         )
-        detect_page.on_submit = lambda q, page=detect_page: threaded_query(q.strip(), page.response)
         pager.add_page(
             detect_page, title=detect_page.title,
             validator=detect_page.is_valid,
-            on_next=lambda pi, p: session.save_question(pi, p.get_data())
+            on_next=lambda pi, p, a=a: session.save_question(pi, {**p.get_data(), "assignment": a._asdict()})
         )
 
     # compare_page = ComparePage(list(active_watermarks().values()), root, pager.notebook)
@@ -189,7 +189,7 @@ def start_user_ui(uuid: str, username: str):
     # pager.add_page(compare_page, title="Watermark Comparison")
 
     # chat_page = ChatPage(root, pager.notebook)
-    # chat_page.on_submit = lambda q: threaded_query(q.strip(), chat_page.response)
+    # chat_page.on_submit = lambda q: threaded_stream_query(q.strip(), chat_page.response_chunk, chat_page.response)
     # pager.add_page(chat_page, title="Chat", validator=lambda: False)
 
     # for _ in range(2):
@@ -228,6 +228,15 @@ if __name__ == "__main__":
     auth_page.on_login = start_user_ui
     root.set_frame(auth_page)
 
+    def on_first_frame():
+        startup.mark("first frame")
+        startup.emit()
+        # credentials + channel setup off the login critical path, once the window is up
+        firebase.prewarm()
+
+    startup.mark("app built")
+    root.after_idle(on_first_frame)
+
     root.mainloop() # blocking call
 
     print("Bye!")
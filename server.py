@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import html
+import itertools
+import os
+import secrets
+import time
+
+import yaml
+
+from services import firebase
+from services.assignment import Assignment, AssignmentEngine
+from services.http import HttpServer, Request, Response, redirect
+from services.llm import wrap_query
+from services.marks import build_marks, create_cache, create_llm
+from services.questions import QuestionBank
+from services.resources import data_dir_path
+from services.survey import SurveySession, min_response_chars, min_word_count
+from services.tracing import Trace, tracer
+from services.watermark import CharMark, Watermark
+from services.writer import WriteBehindWriter, default_journal_dir
+
+# multi-participant server mode: the study flow (terms, introduction, assignment pages, demographics) over http,
+# for lab sessions. one process serves every participant, sharing one llm client (one event loop, bounded
+# concurrency, coalesced prompts), one watermark cache, one question bank and one firestore writer.
+#   python server.py --port 8080
+# participants identify with the id they are given at the lab instead of a google login.
+
+page_amount = 1
+
+
+class AssignmentPage:
+    # web counterpart of DetectPage: one assignment page of one participant
+    def __init__(self, title: str, assignment: Assignment, question: str, watermark: Watermark):
+        self.title = title
+        self.assignment = assignment
+        self.question_text = question.strip().capitalize()
+        self.mark = watermark if assignment.marked else None
+        self.started = time.monotonic()
+        self.user_query = ""
+        self.model_response = ""
+        self.error: str | None = None
+        self.pending = False
+        self.survey: dict | None = None
+        self.traces: list[Trace] = []
+
+    def parse_survey(self, form: dict[str, str]) -> dict | None:
+        # the survey answers, None while they are incomplete (same rules as DetectPage.is_valid)
+        is_wm = form.get("is_wm")
+        if is_wm == "no": return {"is_wm": False}
+        if is_wm != "yes": return None
+        survey = {
+            "is_wm": True,
+            "reasoning": form.get("reasoning", "").strip(),
+            "text_edited": form.get("text_edited", "").strip(),
+            "edited_action": form.get("edited_action", "").strip(),
+        }
+        if len(survey["reasoning"]) < min_response_chars or len(survey["edited_action"]) < min_response_chars:
+            return None
+        return survey
+
+    def get_data(self) -> dict:
+        return {
+            "t": round(time.monotonic() - self.started, 3),
+            "timings": [t.timings() for t in self.traces],
+            "question": self.question_text,
+            "user_query": self.user_query,
+            "model_response": self.model_response,
+            "user_survey": self.survey,
+            "assignment": self.assignment._asdict(),
+        }
+
+
+class Participant:
+    def __init__(self, user_id: str, session: SurveySession, pages: list[AssignmentPage]):
+        self.user_id = user_id
+        self.session = session
+        self.pages = pages
+        # 0 terms, 1 introduction, then the assignment pages, demographics, thanks
+        self.step = 0
+        self.seen = time.monotonic()
+
+    def page(self) -> AssignmentPage | None:
+        i = self.step - 2
+        return self.pages[i] if 0 <= i < len(self.pages) else None
+
+
+def _e(s: str) -> str:
+    return html.escape(s, quote=True)
+
+
+def _html(title: str, *body: str) -> Response:
+    return Response(
+        "<!doctype html><html><head><meta charset='utf-8'>"
+        f"<title>{_e(title)}</title>"
+        "<style>body{font-family:Arial,sans-serif;max-width:50em;margin:2em auto;padding:0 1em}"
+        "textarea{width:100%}.text{white-space:pre-wrap;border:1px inset;padding:.5em}</style>"
+        f"</head><body><h2>{_e(title)}</h2>{''.join(body)}</body></html>"
+    )
+
+
+def _form(action: str, *fields: str, submit: str = "Next") -> str:
+    return f"<form method='post' action='{action}'>{''.join(fields)}<p><button>{_e(submit)}</button></p></form>"
+
+
+def _radios(name: str, options: list[tuple[str, str]]) -> str:
+    return " ".join(
+        f"<label><input type='radio' name='{name}' value='{_e(value)}'> {_e(text)}</label>" for text, value in options
+    )
+
+
+class Study:
+    def __init__(self, config: dict, session_ttl: float = 4 * 3600):
+        self.config = config
+        self.session_ttl = session_ttl
+
+        # shared by every participant
+        self.llm = create_llm(config)
+        marks = build_marks(config, self.llm, create_cache(config))
+        self.watermarks: dict[str, Watermark] = {
+            k: v[0] if isinstance(v, tuple) else v for k, v in marks.items() if k in config['watermarks']
+        }
+        self.questions = QuestionBank(data_dir_path + "questions.txt")
+        self.assigner = AssignmentEngine(
+            list(self.watermarks.keys()), len(self.questions), mark_prob=1.0, seed=config.get('assignment_seed', "")
+        )
+        self.writer = WriteBehindWriter(
+            firebase.prewarm, journal_dir=config.get('journal_dir', default_journal_dir)
+        )
+
+        with open(data_dir_path + "terms.txt", "rt", encoding="utf-8") as f:
+            self.terms_text = f.read()
+        with open(data_dir_path + "introduction.txt", "rt", encoding="utf-8") as f:
+            self.intro_text = f.read()
+
+        self.participants: dict[str, Participant] = {}
+        # this process sees every login, so participants get consecutive ordinals: exact balance per block, but
+        # only within one server run (a restart, or a second process, starts over at 0)
+        self.ordinals = itertools.count()
+
+    def routes(self, server: HttpServer):
+        server.route("GET", "/")(self.index)
+        server.route("POST", "/login")(self.login)
+        server.route("GET", "/study")(self.show)
+        server.route("POST", "/study/query")(self.query)
+        server.route("POST", "/study/next")(self.next)
+
+    # participants
+
+    def _expire(self):
+        now = time.monotonic()
+        for sid in [sid for sid, p in self.participants.items() if now - p.seen > self.session_ttl]:
+            del self.participants[sid]
+
+    def _participant(self, request: Request) -> Participant | None:
+        p = self.participants.get(request.cookie("sid") or "")
+        if p is not None: p.seen = time.monotonic()
+        return p
+
+    def _start(self, user_id: str) -> Participant:
+        ordinal = next(self.ordinals)
+        pages = []
+        for i in range(page_amount):
+            a = self.assigner.assign(user_id, page=i, ordinal=ordinal)
+            pages.append(AssignmentPage(f"Assignment {i + 1}", a, self.questions[a.question], self.watermarks[a.mark]))
+        return Participant(user_id, SurveySession(db=None, user_id=user_id, writer=self.writer), pages)
+
+    # handlers
+
+    async def index(self, request: Request) -> Response:
+        if self._participant(request) is not None: return redirect("/study")
+        return _html(
+            "Login",
+            _form(
+                "/login",
+                "<p>Enter the participant id you were given:</p>",
+                "<p><input name='user_id' required autofocus></p>",
+                submit="Log in",
+            ),
+        )
+
+    async def login(self, request: Request) -> Response:
+        user_id = request.form().get("user_id", "").strip()
+        if not user_id: return redirect("/")
+        self._expire()
+        sid = secrets.token_urlsafe(24)
+        self.participants[sid] = self._start(user_id)
+        print(f"user {user_id} login ({len(self.participants)} active)")
+        return redirect("/study", {"Set-Cookie": f"sid={sid}; HttpOnly; SameSite=Lax; Path=/"})
+
+    async def query(self, request: Request) -> Response:
+        p = self._participant(request)
+        if p is None: return redirect("/")
+        page = p.page()
+        q = request.form().get("q", "").strip()
+        if page is None or page.pending or page.model_response or not q: return redirect("/study")
+        page.pending = True
+        page.error = None
+        trace = tracer.trace("query", page=page.title)
+        page.traces.append(trace)
+        try:
+            response = await asyncio.wrap_future(self.llm.submit(wrap_query(q, min_word_count), trace))
+            text = response.text
+            if page.mark is not None:
+                with trace.span("watermark"):
+                    # char marks are cheap enough for the event loop, anything else runs on a worker thread
+                    if isinstance(page.mark, CharMark): text = page.mark(text)
+                    else: text = await asyncio.to_thread(page.mark, text)
+            page.user_query = q
+            page.model_response = text
+            trace.end()
+        except Exception as e:
+            page.error = f"Error: {e}"
+            trace.end(error=repr(e))
+        finally:
+            page.pending = False
+        return redirect("/study")
+
+    async def next(self, request: Request) -> Response:
+        p = self._participant(request)
+        if p is None: return redirect("/")
+        form = request.form()
+        page = p.page()
+        if page is not None:
+            if not page.model_response: return redirect("/study")
+            page.survey = page.parse_survey(form)
+            if page.survey is None:
+                page.error = f"Please answer the question (explanations of at least {min_response_chars} characters)."
+                return redirect("/study")
+            # the desktop pager's index of the page (introduction 0, assignments from 1), so both front ends
+            # write the same pages/{i} documents
+            p.session.save_question(p.step - 1, page.get_data())
+        elif p.step == 2 + len(p.pages):
+            p.session.save_demographics({
+                k: form.get(k) or None for k in ("gender", "edu_pursuing", "edu_field", "age", "ai_use_freq")
+            })
+        if p.step < 3 + len(p.pages): p.step += 1
+        if p.page() is not None: p.page().started = time.monotonic()
+        return redirect("/study")
+
+    async def show(self, request: Request) -> Response:
+        p = self._participant(request)
+        if p is None: return redirect("/")
+        if p.step == 0:
+            return _html(
+                "Consent Form",
+                "<p><i>Please read the form below carefully.</i></p>",
+                f"<div class='text'>{_e(self.terms_text)}</div>",
+                _form("/study/next", submit="Accept Terms and Continue"),
+            )
+        if p.step == 1:
+            return _html(
+                "Introduction & Instructions",
+                f"<div class='text'><i>{_e(self.intro_text)}</i></div>",
+                _form("/study/next", submit="Confirm"),
+            )
+        page = p.page()
+        if page is not None: return self._show_page(page)
+        if p.step == 2 + len(p.pages): return self._show_demographics()
+        return _html("Thanks for Participating!", "<p>You may close this window.</p>")
+
+    def _show_page(self, page: AssignmentPage) -> Response:
+        error = f"<p style='color:red'>{_e(page.error)}</p>" if page.error else ""
+        question = (
+            "<p>You are given below a question from a school assignment, and an AI Assistant.</p>"
+            "<p>Use the AI Assistant given here for help with the assignment, by writing a single prompt question "
+            "- as long as you'd like - to help you solve the question.</p>"
+            f"<p>question:<br><b><i>{_e(page.question_text)}</i></b></p>"
+        )
+        if not page.model_response:
+            return _html(
+                page.title, question, error,
+                "<h3>AI Model</h3><p>Hi! How can I help you today?</p>",
+                _form("/study/query", "<textarea name='q' rows='4' required></textarea>", submit="Send"),
+            )
+        n = min_response_chars
+        return _html(
+            page.title,
+            question,
+            f"<h3>AI Model</h3><p><i>{_e(page.user_query)}</i></p><p>Response:</p>",
+            f"<div class='text'>{_e(page.model_response)}</div>",
+            error,
+            _form(
+                "/study/next",
+                "<h3>Observe the response text you've received:</h3>",
+                "<p>Do you believe it has been watermarked? You may use any external resource.</p>",
+                _radios("is_wm", [("Yes", "yes"), ("No", "no")]),
+                f"<p>What made you think text was watermarked? (at least {n} characters)</p>",
+                "<textarea name='reasoning' rows='3'></textarea>",
+                "<p>If so, try to remove it by editing the text response. Do you best to remove only the watermark "
+                "and keep the original text intact as much as possible.</p>",
+                f"<textarea name='text_edited' rows='12'>{_e(page.model_response)}</textarea>",
+                f"<p>What did you do to try and remove the watermark? (at least {n} characters)</p>",
+                "<textarea name='edited_action' rows='3'></textarea>",
+                submit="Confirm",
+            ),
+        )
+
+    def _show_demographics(self) -> Response:
+        ages = ["18 or below", "18-20", *(f"{a + 1}-{a + 5}" for a in range(20, 50, 5)), "51 or above"]
+        return _html(
+            "Demographic Information",
+            "<p><i>(This page is optional.)</i></p>",
+            _form(
+                "/study/next",
+                "<p>Gender:<br>", _radios("gender", [("Male", "m"), ("Female", "f"), ("Other", "o")]), "</p>",
+                "<p>What Degree are you currently pursuing?<br>",
+                _radios("edu_pursuing", [("BSc", "bsc"), ("MSc", "msc"), ("PhD", "phd")]), "</p>",
+                "<p>What is the field of your Degree?<br><input name='edu_field'></p>",
+                "<p>Age:<br>", _radios("age", [(a, a) for a in ages]), "</p>",
+                "<p>Do you use AI tools? If so, how often?<br>",
+                _radios("ai_use_freq", [
+                    ("No", "no"),
+                    ("Several times a Day", "several times a day"),
+                    ("On a Daily basis", "daily"),
+                    ("On a Weekly basis", "weekly"),
+                    ("On a Monthly basis", "monthly"),
+                    ("On a Yearly basis", "yearly"),
+                ]), "</p>",
+                submit="Finish",
+            ),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve the study to many participants over http")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--config", default=os.environ.get("WM_CONFIG_PATH", data_dir_path + "config.yml"))
+    args = parser.parse_args()
+
+    with open(args.config, 'rt') as f:
+        config = yaml.safe_load(f)
+
+    study = Study(config, session_ttl=float(config.get('server_session_ttl', 4 * 3600)))
+    server = HttpServer()
+    study.routes(server)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        study.writer.close()
+        study.llm.close()
+        if study.llm.cache is not None: print(f"llm response cache: {study.llm.cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
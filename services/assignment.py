@@ -0,0 +1,73 @@
+import hashlib
+import math
+from typing import NamedTuple, Sequence
+
+
+class Assignment(NamedTuple):
+    mark: str
+    question: int
+    marked: bool
+
+
+def _van_der_corput(n: int) -> float:
+    # base 2 low discrepancy sequence: any run of consecutive n is spread evenly over [0, 1)
+    q, denom = 0.0, 1.0
+    while n:
+        denom *= 2
+        n, bit = divmod(n, 2)
+        q += bit / denom
+    return q
+
+
+# deterministic watermark x question (x mark_prob outcome) assignment, computed locally in O(1).
+#
+# the (mark, question) cells are laid out as a sequence of blocks; each block is a seeded affine permutation
+# of all cells, so every C consecutive positions (C = marks * questions) hit every cell exactly once.
+# a participant's position is a hash of their user id (no coordination at all: balanced only in expectation,
+# exact balance needs some ordering), or an ordinal where one process sees every sign-up (the server's
+# counter: exact balance per block, for that process only).
+# later pages of the same participant shift both the mark and the question, so they never repeat either
+# while there are enough of them. the marked/unmarked outcome follows a low discrepancy sequence per cell,
+# so the marked share of every cell tracks mark_prob closely.
+class AssignmentEngine:
+    def __init__(self, mark_names: Sequence[str], n_questions: int, mark_prob: float = 1.0, seed: str = ""):
+        if not mark_names or n_questions <= 0: raise ValueError("need at least one mark and one question")
+        self.mark_names = list(mark_names)
+        self.n_questions = n_questions
+        self.mark_prob = mark_prob
+        self.seed = seed
+        self.cells = len(self.mark_names) * n_questions
+
+    def _hash(self, *parts) -> int:
+        h = hashlib.sha256("\0".join(map(str, (self.seed, *parts))).encode("utf-8"))
+        return int.from_bytes(h.digest()[:8], "little")
+
+    def position(self, user_id: str) -> int:
+        return self._hash("user", user_id)
+
+    def _cell(self, position: int) -> tuple[int, int]:
+        # (cell, visit): the cell at this position, and how many times the cell came up before in the sequence
+        block, r = divmod(position, self.cells)
+        a = self._hash("a", block) % self.cells or 1
+        while math.gcd(a, self.cells) != 1: a += 1
+        c = self._hash("c", block) % self.cells
+        return (a * r + c) % self.cells, block
+
+    def assign(self, user_id: str, page: int = 0, ordinal: int | None = None) -> Assignment:
+        position = ordinal if ordinal is not None else self.position(user_id)
+        cell, visit = self._cell(position)
+        m, q = divmod(cell, self.n_questions)
+        m = (m + page) % len(self.mark_names)
+        q = (q + page) % self.n_questions
+
+        if self.mark_prob >= 1.0:
+            marked = True
+        elif self.mark_prob <= 0.0:
+            marked = False
+        else:
+            # low discrepancy over visits to the cell, shifted per cell so cells don't move in lockstep
+            shift = self._hash("u", m, q) / 2 ** 64
+            u = _van_der_corput(visit) if ordinal is not None else self._hash("v", user_id, page) / 2 ** 64
+            marked = (u + shift) % 1.0 < self.mark_prob
+        return Assignment(self.mark_names[m], q, marked)
+
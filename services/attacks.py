@@ -0,0 +1,139 @@
+import itertools
+import math
+import random
+import re
+import unicodedata
+from typing import Callable, Sequence
+
+# randomized removal attacks on watermarked text, as a participant (or a paraphrasing tool) might apply them.
+# each operator takes the text, a seeded rng and the clean corpus (for paraphrase stand-ins that bring in
+# unmarked words). strengths are drawn from the rng, so a trial is reproducible from its seed alone.
+
+Operator = Callable[[str, random.Random, "Corpus"], str]
+
+
+# every unicode space separator (and the zero width ones) -> a plain space / nothing.
+# kept as replace lists rather than translate tables: translate falls back to a dict lookup per char on
+# non-ascii text (see Substitution in services/watermark.py), and ascii text is skipped outright
+_spaces = [
+    *((chr(c), " ") for c in (0x00A0, 0x1680, *range(0x2000, 0x200B), 0x202F, 0x205F, 0x3000)),
+    *((chr(c), "") for c in (0x200B, 0x200C, 0x200D, 0x2060, 0xFEFF)),
+]
+
+# latin lookalikes from cyrillic and greek
+_homoglyphs = list({
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s",
+    "А": "A", "В": "B", "Е": "E", "К": "K", "М": "M", "Н": "H", "О": "O", "Р": "P", "С": "C", "Т": "T",
+    "Х": "X", "ο": "o", "α": "a", "ν": "v", "ι": "i", "Ο": "O", "Α": "A", "Β": "B", "Ε": "E", "Ζ": "Z",
+    "Η": "H", "Ι": "I", "Κ": "K", "Μ": "M", "Ν": "N", "Ρ": "P", "Τ": "T", "Χ": "X", "Υ": "Y",
+}.items())
+
+# symbols that can stand in for a space, e.g. "word#word"
+_joiners = "#_~|^*+="
+
+# words as a reader sees them, whatever separates them. split keeps the separators: words at the odd indices
+_word = re.compile(r"([^\W_]+)")
+
+
+def _replace(s: str, pairs) -> str:
+    for c, r in pairs:
+        if c in s: s = s.replace(c, r)
+    return s
+
+
+def _words(s: str, p: float, rng: random.Random, corpus: "Corpus") -> tuple[list[str], list[int]]:
+    # the split text, and the indices of its words picked each with probability p: drawn as geometric gaps
+    # between picks, one draw per picked word rather than one per word
+    parts = corpus.split(s)
+    picked = []
+    step = math.log(1 - p)
+    i = 1 + 2 * int(math.log(1 - rng.random()) / step)
+    while i < len(parts):
+        picked.append(i)
+        i += 2 + 2 * int(math.log(1 - rng.random()) / step)
+    return parts, picked
+
+
+class Corpus:
+    # the clean texts, and their words as a vocabulary for substitutions.
+    # attacked: texts that are attacked over and over (the marked texts), up to max_cached of them keep their
+    # word split, the bulk of a paraphrase stand-in's cost
+    def __init__(self, texts: Sequence[str], attacked: Sequence[str] = (), max_cached: int = 20000):
+        self.texts = list(texts)
+        self.words = sorted({w for t in self.texts for w in _word.findall(t)}) or ["the"]
+        self._splits = {t: _word.split(t) for t in itertools.islice(attacked, max_cached)}
+
+    def split(self, s: str) -> list[str]:
+        parts = self._splits.get(s)
+        return _word.split(s) if parts is None else parts.copy()
+
+
+def normalize_whitespace(s: str, rng: random.Random, corpus: Corpus) -> str:
+    return s if s.isascii() else _replace(s, _spaces)
+
+
+def casefold(s: str, rng: random.Random, corpus: Corpus) -> str:
+    # the whole text, or (as someone fixing it by hand) only some of its sentences
+    if rng.random() < 0.5: return s.lower()
+    p = rng.uniform(0.1, 0.9)
+    return "".join(x.lower() if rng.random() < p else x for x in re.split(r"(?<=[.!?\n])", s))
+
+
+def undo_homoglyphs(s: str, rng: random.Random, corpus: Corpus) -> str:
+    if s.isascii(): return s
+    return unicodedata.normalize("NFKC", _replace(s, _homoglyphs))
+
+
+def undo_rn(s: str, rng: random.Random, corpus: Corpus) -> str:
+    return s.replace("rn", "m").replace("RN", "M")
+
+
+def split_joined(s: str, rng: random.Random, corpus: Corpus) -> str:
+    return _replace(s, ((c, " ") for c in _joiners))
+
+
+def substitute_words(s: str, rng: random.Random, corpus: Corpus) -> str:
+    # paraphrase stand-in: a share of the words swapped for clean words
+    parts, picked = _words(s, rng.uniform(0.05, 0.5), rng, corpus)
+    for i, w in zip(picked, rng.choices(corpus.words, k=len(picked))): parts[i] = w
+    return "".join(parts)
+
+
+def drop_words(s: str, rng: random.Random, corpus: Corpus) -> str:
+    parts, picked = _words(s, rng.uniform(0.05, 0.3), rng, corpus)
+    for i in picked: parts[i] = ""
+    return "".join(parts)
+
+
+def rewrite_span(s: str, rng: random.Random, corpus: Corpus) -> str:
+    # paraphrase stand-in: a contiguous part of the text retyped, i.e. replaced by clean text of the same length
+    if not s: return s
+    n = int(len(s) * rng.uniform(0.1, 0.6))
+    start = rng.randrange(len(s) - n + 1)
+    clean = rng.choice(corpus.texts) or " "
+    fill = (clean * (n // len(clean) + 1))[:n]
+    return s[:start] + fill + s[start + n:]
+
+
+# name -> operator, in the order they are applied. a trial's operators are stored as a bitmask of this order.
+# word level stand-ins first: they mostly get the marked text itself, whose split the corpus may have kept
+operators: dict[str, Operator] = {
+    "substitute": substitute_words,
+    "drop": drop_words,
+    "rewrite": rewrite_span,
+    "whitespace": normalize_whitespace,
+    "casefold": casefold,
+    "homoglyphs": undo_homoglyphs,
+    "rn": undo_rn,
+    "joined": split_joined,
+}
+
+
+def attack(s: str, mask: int, rng: random.Random, corpus: Corpus, names: Sequence[str] = tuple(operators)) -> str:
+    for bit, name in enumerate(names):
+        if mask >> bit & 1: s = operators[name](s, rng, corpus)
+    return s
+
+
+def mask_names(mask: int, names: Sequence[str] = tuple(operators)) -> list[str]:
+    return [name for bit, name in enumerate(names) if mask >> bit & 1]
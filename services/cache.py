@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from services.llm import normalize_prompt
+from services.watermark import CharMark, Watermark
+
+default_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "cs-f-wm")
+
+
+def content_key(*parts: Any, text: str) -> str:
+    h = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+# bounded in-memory LRU in front of an sqlite store, evicted by total value size (least recently used first).
+# entries older than ttl seconds (if given) count as missing. safe to share between threads; the store
+# survives restarts.
+class DiskLRU:
+    def __init__(self, path: str, max_bytes: int = 256 << 20, memory_entries: int = 1024, ttl: float | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+
+        # key -> (value, creation time)
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, size INTEGER, atime REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+        if "ctime" not in {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}:
+            # stores from before ttl support: their entries count as created now
+            self._db.execute("ALTER TABLE entries ADD COLUMN ctime REAL")
+            self._db.execute("UPDATE entries SET ctime = ?", (time.time(),))
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _remember(self, key: str, value: str, ctime: float):
+        self._memory[key] = (value, ctime)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _is_expired(self, ctime: float | None, now: float) -> bool:
+        return self.ttl is not None and ctime is not None and now - ctime > self.ttl
+
+    def _drop(self, key: str):
+        self._memory.pop(key, None)
+        row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None: return
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._size -= row[0]
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                value, ctime = self._memory[key]
+                if not self._is_expired(ctime, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+            row = self._db.execute("SELECT value, ctime FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._is_expired(row[1], now):
+                self.expired += 1
+                self._drop(key)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET atime = ? WHERE key = ?", (now, key))
+            self._remember(key, row[0], row[1] if row[1] is not None else now)
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8", "surrogatepass"))
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if size > self.max_bytes: return
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, atime, ctime) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes: self._evict()
+
+    def _evict(self):
+        # drop expired entries, then least recently used ones, down to 90% of the budget
+        if self.ttl is not None:
+            cutoff = time.time() - self.ttl
+            expired = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE ctime < ?", (cutoff,))
+            self._size -= expired.fetchone()[0]
+            self._db.execute("DELETE FROM entries WHERE ctime < ?", (cutoff,))
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY atime").fetchall()
+        dropped = []
+        for key, size in rows:
+            if self._size <= target: break
+            dropped.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", dropped)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries, "bytes": self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM entries")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachedWatermark:
+    def __init__(self, cache: "WatermarkCache", name: str, mark: Watermark, mark_config: Any = None):
+        self.cache = cache
+        self.name = name
+        self.mark = mark
+        self.mark_config = mark_config
+
+    def __call__(self, s: str) -> str:
+        key = content_key(self.name, self.mark_config, text=s)
+        cached = self.cache.store.get(key)
+        if cached is not None: return cached
+        r = self.mark(s)
+        self.cache.store.put(key, r)
+        return r
+
+
+# content-addressed cache for watermark outputs, keyed by (mark name, mark config, text hash).
+class WatermarkCache:
+    def __init__(self, cache_dir: str = default_cache_dir, max_bytes: int = 256 << 20, memory_entries: int = 1024):
+        self.store = DiskLRU(os.path.join(cache_dir, "watermarks.sqlite3"), max_bytes, memory_entries)
+
+    def wrap(self, name: str, mark: Watermark, mark_config: Any = None) -> Watermark:
+        # char marks are cheaper to recompute than to hash and look up (see bench.run), and stay fusable as is
+        if isinstance(mark, CharMark): return mark
+        return CachedWatermark(self, name, mark, mark_config)
+
+    def wrap_all(self, marks: dict, mark_configs: dict[str, Any] | None = None) -> dict:
+        # wraps every mark of a marks dict, keeping (Watermark, Detector) tuples intact
+        mark_configs = mark_configs or {}
+        return {
+            k:
+                (self.wrap(k, v[0], mark_configs.get(k)), *v[1:]) if isinstance(v, tuple)
+                else self.wrap(k, v, mark_configs.get(k))
+            for k, v in marks.items()
+        }
+
+
+# opt-in cache of llm response texts, keyed by model and normalized prompt (see services.llm.normalize_prompt),
+# so near-identical participant queries share one gemini call. entries expire after ttl seconds
+class ResponseCache:
+    def __init__(
+            self, cache_dir: str = default_cache_dir, ttl: float = 24 * 3600,
+            max_bytes: int = 64 << 20, memory_entries: int = 512
+    ):
+        self.store = DiskLRU(os.path.join(cache_dir, "responses.sqlite3"), max_bytes, memory_entries, ttl)
+        self.bypassed = 0
+
+    def key(self, model: str, q: str) -> str | None:
+        normalized = normalize_prompt(q)
+        return content_key("response", model, text=normalized) if normalized is not None else None
+
+    def get(self, model: str, q: str) -> str | None:
+        key = self.key(model, q)
+        if key is None:
+            self.bypassed += 1
+            return None
+        return self.store.get(key)
+
+    def put(self, model: str, q: str, text: str):
+        key = self.key(model, q)
+        if key is not None: self.store.put(key, text)
+
+    def stats(self) -> dict:
+        return {**self.store.stats(), "bypassed": self.bypassed}
@@ -0,0 +1,113 @@
+from typing import Callable, Sequence
+
+import numpy as np
+
+from services.watermark import space_codepoints
+
+Detector = Callable[[str], float]
+Scorer = Callable[[Sequence[str]], np.ndarray]
+
+
+def codepoints(texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    # all texts as one codepoint array, each followed by a NUL separator (so bigrams never span two texts).
+    # returns the array and the start offset of every text in it.
+    joined = "\0".join(texts) + "\0"
+    cps = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    return cps, starts
+
+
+def count(mask: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    # per-text count of True entries
+    if not len(starts): return np.zeros(0, dtype=np.int64)
+    return np.add.reduceat(mask.astype(np.int64), starts)
+
+
+def ratio(hits: np.ndarray, total: np.ndarray) -> np.ndarray:
+    # hits / total, 0.0 where nothing was counted
+    out = np.zeros(len(hits), dtype=np.float64)
+    np.divide(hits, total, out=out, where=total > 0)
+    return out
+
+
+def _is(cps: np.ndarray, *chars: str | int) -> np.ndarray:
+    return np.isin(cps, [ord(c) if isinstance(c, str) else c for c in chars])
+
+
+def _bigram(cps: np.ndarray, a: str, b: str) -> np.ndarray:
+    mask = np.zeros(len(cps), dtype=bool)
+    mask[:-1] = (cps[:-1] == ord(a)) & (cps[1:] == ord(b))
+    return mask
+
+
+def _scorer(fn: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> Scorer:
+    # scorers are written over the codepoint arrays, but take a list of texts
+    def score(texts: Sequence[str]) -> np.ndarray:
+        return fn(*codepoints(texts))
+
+    score.on_codepoints = fn
+    return score
+
+
+# ratio of upper case letters out of all (ascii) letters
+@_scorer
+def upper_ratio(cps: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    upper = count((cps >= ord('A')) & (cps <= ord('Z')), starts)
+    lower = count((cps >= ord('a')) & (cps <= ord('z')), starts)
+    return ratio(upper, upper + lower)
+
+
+# ratio of '#' out of all space-like separators
+@_scorer
+def hash_space_ratio(cps: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    hashes = count(_is(cps, '#'), starts)
+    spaces = count(_is(cps, ' '), starts)
+    return ratio(hashes, hashes + spaces)
+
+
+# share of 'b' out of a+b. plain english sits around 0.15, fully marked text at 1.0
+@_scorer
+def ab_skew(cps: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    a = count(_is(cps, 'a', 'A'), starts)
+    b = count(_is(cps, 'b', 'B'), starts)
+    return ratio(b, a + b)
+
+
+# share of "rn" bigrams out of rn+m
+@_scorer
+def rn_ratio(cps: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    rn = count(_bigram(cps, 'r', 'n') | _bigram(cps, 'R', 'N'), starts)
+    m = count(_is(cps, 'm', 'M'), starts)
+    return ratio(rn, rn + m)
+
+
+# ratio of U+2004-U+2008 spaces out of all spaces
+@_scorer
+def unicode_space_ratio(cps: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    special = count(_is(cps, *space_codepoints), starts)
+    spaces = count(_is(cps, ' '), starts)
+    return ratio(special, special + spaces)
+
+
+scorers: dict[str, Scorer] = {
+    "upper": upper_ratio,
+    "space#": hash_space_ratio,
+    "ab": ab_skew,
+    "phishing": rn_ratio,
+    "space-replace": unicode_space_ratio,
+}
+
+
+def single(scorer: Scorer) -> Detector:
+    return lambda s: float(scorer([s])[0])
+
+
+def score_batch(texts: Sequence[str], names: Sequence[str] | None = None) -> dict[str, np.ndarray]:
+    # score every text with every (or the given) scorer, converting the texts to codepoints only once
+    cps, starts = codepoints(list(texts))
+    return {
+        name: scorers[name].on_codepoints(cps, starts)
+        for name in (names or scorers.keys()) if name in scorers
+    }
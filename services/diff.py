@@ -0,0 +1,250 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable, Iterable, Sequence
+
+from services.watermark import CharMark, space_codepoints
+
+# edit analysis of participant edits: model_response (the marked text shown) against user_survey.text_edited.
+# - distance: levenshtein over chars and over words, bit-parallel (Myers / Hyyro) on python ints, so a step
+#   costs one big-int operation per text position whatever the length
+# - alignment: char level edit ops, found by a word level O(ND) diff over mark-normalized words (so text that
+#   only differs by watermark artifacts aligns as equal) refined to chars inside changed words
+# - attribution: per char mark, how many edited chars undo that mark's artifacts, and how many are other changes
+# diff_batch spreads pairs over a process pool.
+
+Op = tuple[str, int, int, int, int]  # tag (replace, delete, insert), a[i1:i2] -> b[j1:j2]
+
+_tokens = re.compile(r"\w+|\s+|[^\w\s]")
+
+# length preserving normalization for aligning words: case, and the artifacts of the one char -> one char marks.
+# applied to both texts, so it may merge unrelated chars (every b becomes a) without harm: it only decides
+# which words are compared with which
+_canon = str.maketrans({
+    **{chr(c): chr(c + 32) for c in range(ord('A'), ord('Z') + 1)},
+    '#': ' ', 'b': 'a', **{chr(c): ' ' for c in space_codepoints},
+})
+
+
+def _trim(a: Sequence, b: Sequence) -> tuple[int, int]:
+    # lengths of the common prefix and (of the rest) common suffix
+    n, m = len(a), len(b)
+    lo = 0
+    while lo < n and lo < m and a[lo] == b[lo]: lo += 1
+    hi = 0
+    while hi < n - lo and hi < m - lo and a[n - 1 - hi] == b[m - 1 - hi]: hi += 1
+    return lo, hi
+
+
+def levenshtein(a: Sequence[Hashable], b: Sequence[Hashable]) -> int:
+    # bit-parallel edit distance: one bit per position of the longer sequence, one step per element of the other
+    lo, hi = _trim(a, b)
+    a, b = a[lo:len(a) - hi], b[lo:len(b) - hi]
+    if len(a) < len(b): a, b = b, a
+    if not b: return len(a)
+    m = len(a)
+    peq: dict = {}
+    for i, c in enumerate(a): peq[c] = peq.get(c, 0) | (1 << i)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & high: score += 1
+        elif mh & high: score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+def _matches(a: Sequence, b: Sequence, max_d: int) -> list[tuple[int, int]] | None:
+    # myers' greedy O((N+M)D) diff: the matched index pairs of a shortest edit script, None beyond max_d edits
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    for d in range(max_d + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            x = v[k + 1] if k == -d or (k != d and v[k - 1] < v[k + 1]) else v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x, y = x + 1, y + 1
+            v[k] = x
+            if x >= n and y >= m: return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace: list[dict], x: int, y: int) -> list[tuple[int, int]]:
+    pairs = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        prev_k = k + 1 if k == -d or (k != d and v[k - 1] < v[k + 1]) else k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        # the snake (diagonal of matches) back to the end of this edit
+        while x > prev_x and y > prev_y:
+            x, y = x - 1, y - 1
+            pairs.append((x, y))
+        x, y = prev_x, prev_y
+    pairs.reverse()
+    return pairs
+
+
+def _opcodes(pairs: Iterable[tuple[int, int]], n: int, m: int) -> list[Op]:
+    # the gaps between matched pairs, as ops
+    ops = []
+    i = j = 0
+    for x, y in [*pairs, (n, m)]:
+        if x > i or y > j:
+            tag = "replace" if x > i and y > j else "delete" if x > i else "insert"
+            ops.append((tag, i, x, j, y))
+        i, j = x + 1, y + 1
+    return ops
+
+
+def _diff(a: Sequence, b: Sequence, max_d: int) -> list[Op]:
+    # ops between a and b, after trimming the common prefix and suffix. one replace beyond max_d edits
+    lo, hi = _trim(a, b)
+    a, b = a[lo:len(a) - hi], b[lo:len(b) - hi]
+    if not a and not b: return []
+    pairs = _matches(a, b, max_d)
+    if pairs is None: ops = [("replace", 0, len(a), 0, len(b))]
+    else: ops = _opcodes(pairs, len(a), len(b))
+    return [(t, i1 + lo, i2 + lo, j1 + lo, j2 + lo) for t, i1, i2, j1, j2 in ops]
+
+
+def _spans(s: str) -> tuple[list[str], list[int]]:
+    # normalized words and their start offsets (the normalization keeps offsets), plus the end
+    canon = s.translate(_canon)
+    words, starts = [], []
+    for w in _tokens.finditer(canon):
+        words.append(w.group())
+        starts.append(w.start())
+    starts.append(len(s))
+    return words, starts
+
+
+def align(a: str, b: str, max_d: int = 2000) -> list[Op]:
+    # char level ops turning a into b
+    wa, sa = _spans(a)
+    wb, sb = _spans(b)
+    ops = []
+    i = j = 0
+    for tag, i1, i2, j1, j2 in [*_diff(wa, wb, max_d), ("end", len(wa), len(wa), len(wb), len(wb))]:
+        # words that are equal once normalized: compared char by char in place, e.g. removed artifacts
+        ca, cb = sa[i], sb[j]
+        x, y = a[ca:sa[i1]], b[cb:sb[j1]]
+        if x != y:
+            k = 0
+            while k < len(x):
+                if x[k] == y[k]:
+                    k += 1
+                    continue
+                e = k
+                while e < len(x) and x[e] != y[e]: e += 1
+                ops.append(("replace", ca + k, ca + e, cb + k, cb + e))
+                k = e
+        if tag == "end": break
+        # changed words: a char level diff of just that region
+        ca, cb = sa[i1], sb[j1]
+        ops.extend(
+            (t, ca + x1, ca + x2, cb + y1, cb + y2)
+            for t, x1, x2, y1, y2 in _diff(a[ca:sa[i2]], b[cb:sb[j2]], max_d)
+        )
+        i, j = i2, j2
+    return ops
+
+
+class Undo:
+    # what undoing one char mark looks like: its replacements turned back, or a change of case only
+    def __init__(self, mark: CharMark, samples: int = 64):
+        self.upper = mark.upper
+        # a sampled mark draws from a small set of tables; the union of a few dozen draws covers it
+        tables = [mark.sample() for _ in range(samples)] if mark.sample else [mark.table]
+        self.inverse = {r: c for t in tables for c, r in t.items()}
+
+    def __call__(self, s: str) -> str:
+        for r, c in self.inverse.items():
+            s = s.replace(r, c)
+        return s
+
+    def removes(self, src: str, dst: str) -> bool:
+        if src == dst: return False
+        if self.upper and src.lower() == dst.lower(): return True
+        return bool(self.inverse) and self(src) == dst
+
+    def attribute(self, src: str, dst: str) -> tuple[int, int]:
+        # (artifact chars, other chars) of one op
+        if self.removes(src, dst): return max(len(src), len(dst)), 0
+        if len(src) != len(dst) or not src: return 0, max(len(src), len(dst))
+        artifact = sum(x != y and self.removes(x, y) for x, y in zip(src, dst))
+        return artifact, sum(x != y for x, y in zip(src, dst)) - artifact
+
+
+def analyze(a: str, b: str, undos: dict[str, Undo] | None = None, max_d: int = 2000) -> dict:
+    a, b = a.strip(), b.strip()
+    ops = align(a, b, max_d)
+    result = {
+        "chars": len(a),
+        "char_distance": levenshtein(a, b),
+        "word_distance": levenshtein(_tokens.findall(a), _tokens.findall(b)),
+        "ops": len(ops),
+        "inserted": sum(j2 - j1 for t, _, _, j1, j2 in ops if t == "insert"),
+        "deleted": sum(i2 - i1 for t, i1, i2, _, _ in ops if t == "delete"),
+        "replaced": sum(i2 - i1 for t, i1, i2, _, _ in ops if t == "replace"),
+    }
+    if undos:
+        attribution = {}
+        for name, undo in undos.items():
+            artifact = other = 0
+            for _, i1, i2, j1, j2 in ops:
+                x, y = undo.attribute(a[i1:i2], b[j1:j2])
+                artifact, other = artifact + x, other + y
+            attribution[name] = {"artifact": artifact, "other": other}
+        result["attribution"] = attribution
+    return result
+
+
+def undos(marks: dict) -> dict[str, Undo]:
+    # from a marks dict (services.marks.char_marks / build_marks): char marks only, anything else (e.g. the
+    # acrostic rewrite) has no char level artifacts to attribute
+    out = {}
+    for name, m in marks.items():
+        mark = m[0] if isinstance(m, tuple) else m
+        if isinstance(mark, CharMark): out[name] = Undo(mark)
+    return out
+
+
+# per worker process state, set up by _init
+_undos: dict[str, Undo] = {}
+
+
+def _init(names: Sequence[str] | None):
+    from services.marks import char_marks
+    _undos.update(undos({k: v for k, v in char_marks.items() if names is None or k in names}))
+
+
+def _analyze_chunk(pairs: list[tuple[str, str]]) -> list[dict]:
+    return [analyze(a, b, _undos) for a, b in pairs]
+
+
+def diff_batch(
+        pairs: Iterable[tuple[str, str]], names: Sequence[str] | None = None,
+        workers: int | None = None, chunk: int = 64,
+) -> list[dict]:
+    # analyze(a, b) for every pair, attributed to the given (default: every) char mark, in input order
+    pairs = list(pairs)
+    chunks = [pairs[i:i + chunk] for i in range(0, len(pairs), chunk)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks) or 1)
+    if workers == 1:
+        _init(names)
+        return [r for c in chunks for r in _analyze_chunk(c)]
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=(names,)) as pool:
+        return [r for rs in pool.map(_analyze_chunk, chunks) for r in rs]
@@ -1,11 +1,51 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import asyncio
+import threading
+from concurrent.futures import Future
 
-from ui.app import data_dir_path
+from services.resources import data_dir_path
 
+# one firebase app + firestore client per process. initialization (credential loading, channel setup) runs on a
+# background thread, started as early as possible with prewarm(); everything else just waits on the same future.
+_lock = threading.Lock()
+_db_future: Future | None = None
 
-def init_db():
-    cred = credentials.Certificate(data_dir_path + 'serviceAccountKey.json')
-    firebase_admin.initialize_app(cred)
 
-    return firestore.client()
+def _create_client():
+    # imported here: firebase_admin is slow to import and not needed before login
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    try:
+        app = firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate(data_dir_path + 'serviceAccountKey.json')
+        app = firebase_admin.initialize_app(cred)
+
+    return firestore.client(app)
+
+
+def prewarm() -> Future:
+    # safe to call any number of times; a failed initialization is retried by the next call
+    global _db_future
+    with _lock:
+        if _db_future is None or (_db_future.done() and _db_future.exception() is not None):
+            future = _db_future = Future()
+
+            def worker():
+                try:
+                    future.set_result(_create_client())
+                except Exception as e:
+                    print(f"firebase: init failed: {e}")
+                    future.set_exception(e)
+
+            threading.Thread(target=worker, name="firebase-init", daemon=True).start()
+        return _db_future
+
+
+def init_db(timeout: float | None = None):
+    # blocking; returns the shared client
+    return prewarm().result(timeout)
+
+
+async def init_db_async():
+    return await asyncio.wrap_future(prewarm())
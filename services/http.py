@@ -0,0 +1,113 @@
+import asyncio
+from http import HTTPStatus
+from http.cookies import SimpleCookie
+from typing import Awaitable, Callable
+from urllib.parse import parse_qsl, urlsplit
+
+# minimal asyncio http/1.1 server (stdlib only): exact path routes, keep-alive, content-length bodies.
+# enough for the study's form based flow (see server.py), not a general purpose web server.
+
+
+class Request:
+    def __init__(self, method: str, path: str, query: dict[str, str], headers: dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def form(self) -> dict[str, str]:
+        return dict(parse_qsl(self.body.decode("utf-8", "replace"), keep_blank_values=True))
+
+    def cookie(self, name: str) -> str | None:
+        morsel = SimpleCookie(self.headers.get("cookie", "")).get(name)
+        return morsel.value if morsel else None
+
+
+class Response:
+    def __init__(
+            self, body: str | bytes = b"", status: int = 200,
+            content_type: str = "text/html; charset=utf-8", headers: dict[str, str] | None = None
+    ):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.status = status
+        self.headers = {"Content-Type": content_type, **(headers or {})}
+
+    def encode(self, keep_alive: bool) -> bytes:
+        head = [f"HTTP/1.1 {self.status} {HTTPStatus(self.status).phrase}"]
+        head += [f"{k}: {v}" for k, v in self.headers.items()]
+        head += [f"Content-Length: {len(self.body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + self.body
+
+
+def redirect(location: str, headers: dict[str, str] | None = None) -> Response:
+    # 303: the browser follows a form post with a plain get
+    return Response(status=303, headers={"Location": location, **(headers or {})})
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class HttpServer:
+    def __init__(self, max_body: int = 1 << 20, idle_timeout: float = 30.0):
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+        self.routes: dict[tuple[str, str], Handler] = {}
+        self.connections = 0
+
+    def route(self, method: str, path: str):
+        def register(handler: Handler) -> Handler:
+            self.routes[(method, path)] = handler
+            return handler
+
+        return register
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> tuple[Request, bool] | None:
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line.strip(): return None
+        method, target, version = line.decode("latin-1").split()
+        headers = {}
+        while (h := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body: raise ValueError(f"body of {length} bytes")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        return Request(method, url.path, dict(parse_qsl(url.query)), headers, body), keep_alive
+
+    async def _dispatch(self, request: Request) -> Response:
+        handler = self.routes.get((request.method, request.path))
+        if handler is None: return Response("not found", 404, "text/plain")
+        try:
+            return await handler(request)
+        except Exception as e:
+            print(f"http: {request.method} {request.path} failed: {e!r}")
+            return Response("internal error", 500, "text/plain")
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                parsed = await self._read_request(reader)
+                if parsed is None: break
+                request, keep_alive = parsed
+                writer.write((await self._dispatch(request)).encode(keep_alive))
+                await writer.drain()
+                if not keep_alive: break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            # malformed request line / header, or an oversized body
+            print(f"http: bad request: {e}")
+            writer.write(Response("bad request", 400, "text/plain").encode(False))
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        print(f"serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,223 @@
+import asyncio
+import re
+import threading
+from concurrent.futures import Future
+from typing import Callable, NamedTuple
+
+from services.quota import CircuitBreaker, QuotaScheduler, is_overload, is_upstream_failure
+from services.tracing import Trace, Span, untraced
+
+
+def wrap_query(q: str, min_word_count: int = 100) -> str:
+    # the instructions appended to every participant query
+    return (
+            q + "\n" +
+            f"Your answer must be at least {min_word_count} words long." +
+            "Your answer must be entirely plaintext and contain NO highlights or formatting (no bold, italic or any markdown)."
+    )
+
+
+_wrapped_query = re.compile(
+    r"(.*?)\s*Your answer must be at least (\d+) words long\.\s*"
+    r"Your answer must be entirely plaintext and contain NO highlights or formatting "
+    r"\(no bold, italic or any markdown\)\.\s*",
+    re.S
+)
+
+
+def normalize_prompt(q: str) -> str | None:
+    # canonical form of a participant query (as built by wrap_query), ignoring case, whitespace and the layout of
+    # the appended instructions. None for any other prompt (e.g. acrostic rewrites, which must stay exact)
+    m = _wrapped_query.fullmatch(q)
+    if m is None: return None
+    return " ".join(m.group(1).casefold().split()) + f"\0{m.group(2)}"
+
+
+class CachedResponse(NamedTuple):
+    # stands in for a genai response served from the response cache
+    text: str
+    usage_metadata: None = None
+
+
+def stubborn():
+    # retry policy for upstream calls. tenacity is imported on first use, not at startup.
+    # only overload (429/503) is retried, and those attempts also wait out the quota scheduler's shared cool-down;
+    # an open circuit fails at once
+    from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential_jitter, retry_if_exception
+    return AsyncRetrying(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential_jitter(initial=1, max=10),
+        retry=retry_if_exception(is_overload),
+        reraise=True,
+    )
+
+
+def _tokens_used(response) -> int | None:
+    return getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+
+
+def _usage(response) -> dict:
+    # gemini's token accounting, as span attributes
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None: return {}
+    return {
+        "prompt_tokens": usage.prompt_token_count,
+        "output_tokens": usage.candidates_token_count,
+        "total_tokens": usage.total_token_count,
+    }
+
+
+# asyncio layer around a genai.Client, running on one event loop thread.
+# upstream calls go through one quota scheduler (rpm/tpm buckets, adaptive concurrency capped at max_concurrency)
+# and one circuit breaker, and identical in-flight prompts are coalesced into one call.
+# the tk side submits from any thread and gets a concurrent Future back.
+# client may be a genai.Client or a factory for one, called on the loop thread on first use.
+# with a cache (services.cache.ResponseCache), participant queries are answered from it when possible.
+# calls made under a trace (services.tracing) get an "llm" span with retries, cache/coalescing and token usage.
+class AsyncLLMClient:
+    def __init__(
+            self, client, model: str, max_concurrency: int = 4, cache=None,
+            quota: QuotaScheduler | None = None, breaker: CircuitBreaker | None = None, output_tokens: int = 1024,
+    ):
+        self._client = client
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.quota = quota or QuotaScheduler(max_concurrency)
+        self.breaker = breaker or CircuitBreaker()
+        # expected response size, for the tokens-per-minute bucket until the real usage is known
+        self.output_tokens = output_tokens
+
+        self._inflight: dict[str, asyncio.Task] = {}
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-loop", daemon=True)
+        self._thread.start()
+
+    @property
+    def client(self):
+        if callable(self._client): self._client = self._client()
+        return self._client
+
+    def _estimate(self, q: str) -> int:
+        # ~4 characters per token
+        return len(q) // 4 + self.output_tokens
+
+    async def _attempt(self, call):
+        # one upstream attempt, reported to the breaker (and to the scheduler on overload)
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            if is_overload(e): self.quota.overloaded()
+            if is_upstream_failure(e): self.breaker.failure()
+            else: self.breaker.success()  # upstream answered, e.g. a bad request
+            raise
+        self.breaker.success()
+        return result
+
+    async def _upstream(self, q: str, span: Span):
+        print(f"querying:\n\"{q}\"")
+        estimate = self._estimate(q)
+        async for attempt in stubborn():
+            with attempt:
+                self.breaker.check()
+                async with self.quota.slot(estimate):
+                    response = await self._attempt(
+                        lambda: self.client.aio.models.generate_content(model=self.model, contents=q)
+                    )
+                    self.quota.record(estimate, _tokens_used(response))
+        span.set(retries=attempt.retry_state.attempt_number - 1, **_usage(response))
+        if self.cache is not None and response.text: self.cache.put(self.model, q, response.text)
+        return response
+
+    async def generate(self, q: str, trace: Trace = untraced):
+        with trace.span("llm") as span:
+            if self.cache is not None:
+                text = self.cache.get(self.model, q)
+                if text is not None:
+                    span.set(cached=True)
+                    return CachedResponse(text)
+            task = self._inflight.get(q)
+            if task is None:
+                task = self._inflight[q] = asyncio.ensure_future(self._upstream(q, span))
+                task.add_done_callback(lambda _: self._inflight.pop(q, None))
+            else:
+                # retries and tokens are accounted on the caller that made the call
+                span.set(coalesced=True)
+            # shielded: one caller giving up does not cancel the call for the others
+            return await asyncio.shield(task)
+
+    async def _open_stream(self, q: str, estimate: int, span: Span):
+        # returns holding a quota slot, for the caller to release once the stream is read. like _upstream, every
+        # attempt takes its own slot: retries wait out the shared cool-down and are charged to the buckets
+        print(f"streaming:\n\"{q}\"")
+        async def open_stream():
+            stream = await self.client.aio.models.generate_content_stream(model=self.model, contents=q)
+            # connection errors surface on the first chunk, pull it here so they are retried
+            return await anext(stream, None), stream
+
+        async for attempt in stubborn():
+            with attempt:
+                self.breaker.check()
+                await self.quota.acquire(estimate)
+                try:
+                    first, stream = await self._attempt(open_stream)
+                except BaseException:
+                    await self.quota.release()
+                    raise
+        span.set(retries=attempt.retry_state.attempt_number - 1, first_chunk_ms=round(span.ms, 1))
+        return first, stream
+
+    async def stream(self, q: str, on_chunk: Callable[[str], None], trace: Trace = untraced) -> str:
+        # streams are not coalesced, but count towards the concurrency cap for their whole duration
+        with trace.span("llm", stream=True) as span:
+            if self.cache is not None:
+                text = self.cache.get(self.model, q)
+                if text is not None:
+                    span.set(cached=True)
+                    on_chunk(text)
+                    return text
+            parts = []
+            estimate = self._estimate(q)
+            usage = None
+            first, stream = await self._open_stream(q, estimate, span)
+            try:
+                if getattr(first, "usage_metadata", None) is not None: usage = first
+                if first is not None and first.text:
+                    parts.append(first.text)
+                    on_chunk(first.text)
+                async for chunk in stream:
+                    # the usage totals come with the last chunk
+                    if getattr(chunk, "usage_metadata", None) is not None: usage = chunk
+                    if not chunk.text: continue
+                    parts.append(chunk.text)
+                    on_chunk(chunk.text)
+                self.quota.record(estimate, _tokens_used(usage))
+            finally:
+                await self.quota.release()
+            span.set(**_usage(usage))
+            text = "".join(parts)
+            if self.cache is not None and text: self.cache.put(self.model, q, text)
+            return text
+
+    def submit(self, q: str, trace: Trace = untraced) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.generate(q, trace), self.loop)
+
+    def submit_stream(self, q: str, on_chunk: Callable[[str], None], trace: Trace = untraced) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.stream(q, on_chunk, trace), self.loop)
+
+    def generate_sync(self, q: str):
+        # blocking call for worker threads. must not be called from the loop thread itself
+        return self.submit(q).result()
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        return {"inflight": self.inflight(), "quota": self.quota.stats(), "breaker": self.breaker.stats()}
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,136 @@
+import os
+import random
+from typing import Callable
+
+from services.cache import ResponseCache, WatermarkCache, default_cache_dir
+from services.llm import AsyncLLMClient
+from services.quota import CircuitBreaker, QuotaScheduler
+from services.watermark import CharMark, Watermark, space_codepoints
+
+# the built-in marks, importable without tk, config or network (script.py, batch.py and server.py build on these)
+
+model = "gemini-flash-latest"
+
+Detector = Callable[[str], float]
+
+
+def detector(name: str) -> Detector:
+    # numpy (through services.detection) is only imported once something is actually scored
+    def detect(s: str) -> float:
+        from services import detection
+        return float(detection.scorers[name]([s])[0])
+
+    return detect
+
+
+char_marks: dict[str, tuple[Watermark, Detector]] = {
+    "upper": (CharMark(upper=True), detector("upper")),
+    "space#": (CharMark({' ': '#'}), detector("space#")),
+    "ab": (CharMark({'A': 'B', 'a': 'b'}), detector("ab")),
+    "phishing": (CharMark({'m': 'rn'}), detector("phishing")),
+    "space-replace": (
+        CharMark(sample=lambda: {' ': chr(random.choice(space_codepoints))}),
+        detector("space-replace")
+    ),
+}
+
+
+def acrostic_prompt(s: str, acrostic_config: dict[str, str]) -> str:
+    return (
+        "consider the poem technique of \'acrostic\', where the leading letters of sentence in the poem "
+        "combine sequentially to create a secret hidden message.\n"
+        "Bellow, you are given a piece of text. As an assistant, your task is to rephrase the text such that the letters at "
+        + acrostic_config['position'] +
+        " ends up spelling the secret word:\n"
+        + acrostic_config['mark'] +
+        "\n\n"
+        "* The letters must be hidden! No formatting (bold, italic, letter isolation, etc.) should be added "
+        "that may draw attention to the hidden word "
+        + acrostic_config['mark'] +
+        ".\n"
+        "* The letters must be correct! Make sure that you've rephrased the text properly- such that"
+        " the letters EXACTLY at "
+        + acrostic_config['position'] +
+        " in the new text, when added in isolation one after the other do indeed make out the secret word.\n"
+        "* The position is crucial! Be extremely diligent and ensure the words in that exact position of "
+        + acrostic_config['position'] +
+        " is where the letters add up - ensure that you aren't differing by "
+        "a word or a letter or missing a letter. Rephrase as much as necessary to achieve this.\n"
+        "Do your best to keep the original meaning of the text, and try to keep any "
+        "special formatting, line breaks or spacing the original text has.\n"
+        "Once the full word is fully embedded in "
+        + acrostic_config['position'] +
+        ", do not repeat the letters of the word and simply keep the rest of the text as is.\n"
+        "\n"
+        "Do not respond to this query with anything other than the modified text and only it.\n"
+        "Do NOT add any formatting that may highlight or draw attention towards the hidden letters, "
+        "such as isolating them with symbols or uppercasing them.\n"
+        "Respond only with the modified text.\n"
+        "Here below is the original text:"
+        "\n\n\n"
+        + s
+    )
+
+
+def acrostic_mark(generate: Callable[[str], object], acrostic_config: dict[str, str]) -> Watermark:
+    # generate: prompt -> response with .text (e.g. stubborn_generation)
+    return lambda s: generate(acrostic_prompt(s, acrostic_config)).text
+
+
+def create_llm(config: dict) -> AsyncLLMClient:
+    def create_client():
+        # runs on the llm loop thread on the first query
+        import certifi
+        from google import genai
+
+        os.environ["SSL_CERT_FILE"] = certifi.where()
+        return genai.Client(api_key=config['genai_api_key'])
+
+    # optional quota (llm_quota: rpm / tpm / output_tokens) and breaker settings (llm_breaker: failures / reset_s)
+    quota_config = config.get('llm_quota', {})
+    breaker_config = config.get('llm_breaker', {})
+    max_concurrency = int(config.get('llm_max_concurrency', 4))
+    return AsyncLLMClient(
+        create_client, model,
+        max_concurrency=max_concurrency,
+        cache=create_response_cache(config),
+        quota=QuotaScheduler(max_concurrency, rpm=quota_config.get('rpm'), tpm=quota_config.get('tpm')),
+        breaker=CircuitBreaker(
+            int(breaker_config.get('failures', 5)), float(breaker_config.get('reset_s', 30))
+        ),
+        output_tokens=int(quota_config.get('output_tokens', 1024)),
+    )
+
+
+def create_response_cache(config: dict) -> ResponseCache | None:
+    # off unless config has llm_cache (true, or a dict of ttl_hours / max_mb / memory_entries)
+    llm_cache = config.get('llm_cache')
+    if not llm_cache: return None
+    if llm_cache is True: llm_cache = {}
+    return ResponseCache(
+        config.get('cache', {}).get('dir', default_cache_dir),
+        ttl=float(llm_cache.get('ttl_hours', 24)) * 3600,
+        max_bytes=int(llm_cache.get('max_mb', 64)) << 20,
+        memory_entries=int(llm_cache.get('memory_entries', 512)),
+    )
+
+
+def create_cache(config: dict) -> WatermarkCache:
+    cache_config = config.get('cache', {})
+    return WatermarkCache(
+        cache_config.get('dir', default_cache_dir),
+        max_bytes=int(cache_config.get('max_mb', 256)) << 20,
+        memory_entries=int(cache_config.get('memory_entries', 1024)),
+    )
+
+
+def build_marks(
+        config: dict, llm: AsyncLLMClient | None, cache: WatermarkCache | None, names=None
+) -> dict[str, Watermark | tuple[Watermark, Detector]]:
+    # the marks of the given names (default: all), acrostic generating through llm; cached when a cache is given
+    names = set(names) if names is not None else {*char_marks, "acrostic"}
+    marks = {k: v for k, v in char_marks.items() if k in names}
+    if "acrostic" in names:
+        marks["acrostic"] = acrostic_mark(llm.generate_sync, config['acrostic'])
+    if cache is None: return marks
+    return cache.wrap_all(marks, {"acrostic": {"model": model, **config.get('acrostic', {})}})
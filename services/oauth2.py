@@ -1,10 +1,6 @@
 import os
 
-from google.auth.transport import requests
-from google.oauth2 import id_token
-from google_auth_oauthlib.flow import InstalledAppFlow
-
-from ui.app import data_dir_path
+from services.resources import data_dir_path
 
 os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = "1"
 
@@ -12,17 +8,26 @@ SCOPES = ["openid", "email", "profile"]
 
 client_path = data_dir_path + "oauth_client.json"
 
-def google_login():
+def google_login(timeout: float | None = 300):
+    # blocking until the browser redirect, or timeout seconds (then raises), so an abandoned login ends
+    # google auth libraries are imported on first login, not at startup
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     flow = InstalledAppFlow.from_client_secrets_file(
         client_path,
         SCOPES
     )
 
-    cred = flow.run_local_server(port=0, success_message="Login successful, Returning to application...")
+    cred = flow.run_local_server(
+        port=0, success_message="Login successful, Returning to application...", timeout_seconds=timeout
+    )
 
     return get_user_data(cred)
 
 def get_user_data(cred):
+    from google.auth.transport import requests
+    from google.oauth2 import id_token
+
     info = id_token.verify_oauth2_token(
         cred.id_token,
         requests.Request(),
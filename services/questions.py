@@ -0,0 +1,245 @@
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+from array import array
+from typing import Sequence
+
+from services.cache import default_cache_dir
+
+# question bank over a memory-mapped questions file, with a prebuilt offset index (also memory-mapped),
+# so sampling neither parses nor holds the whole file.
+#
+# one question per line, optionally followed by tab separated key=value tags:
+#   What caused the fall of Rome?<TAB>subject=history<TAB>difficulty=hard
+# untagged lines are fine; blank lines are skipped.
+#
+# index layout (little endian):
+#   header: magic, source size, source mtime_ns, n questions, k strata, strata json length, source sha1
+#   spans:  2n uint64 (start, end) byte offsets of every question line
+#   order:  n uint32 question indices grouped by stratum
+#   starts: k+1 uint64 start of every stratum in order
+#   strata: json list of the tag dict of every stratum
+
+_magic = b"WMQIDX02"
+_header = struct.Struct("<8sQQQQQ20s")
+# the mtime field, rewritten when a copy with a new mtime turns out to have the same contents
+_mtime_offset = 16
+# bytes at either end of the source that go into the default index name
+_edge = 1 << 16
+
+
+def _parse_tags(raw: bytes) -> dict[str, str]:
+    tags = {}
+    for part in raw.decode("utf-8", "replace").split("\t"):
+        k, sep, v = part.partition("=")
+        if sep and k.strip(): tags[k.strip()] = v.strip()
+    return tags
+
+
+def build_index(source_path: str, index_path: str):
+    st = os.stat(source_path)
+    spans = array("Q")
+    strata: dict[str, int] = {}
+    raw_strata: dict[bytes, int] = {}  # raw tag bytes -> stratum, so each distinct tag string is parsed once
+    members: list[array] = []
+    with open(source_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+        try:
+            digest = hashlib.sha1(mm).digest()
+            pos, size = 0, len(mm)
+            while pos < size:
+                end = mm.find(b"\n", pos)
+                if end < 0: end = size
+                line_end = end
+                tab = mm.find(b"\t", pos, end)
+                text_end = tab if tab >= 0 else end
+                if mm[pos:text_end].strip():
+                    raw = mm[tab + 1:end].rstrip(b"\r") if tab >= 0 else b""
+                    stratum = raw_strata.get(raw)
+                    if stratum is None:
+                        key = json.dumps(_parse_tags(raw), sort_keys=True)
+                        if key not in strata:
+                            strata[key] = len(strata)
+                            members.append(array("I"))
+                        stratum = raw_strata[raw] = strata[key]
+                    members[stratum].append(len(spans) // 2)
+                    spans.extend((pos, line_end))
+                pos = end + 1
+        finally:
+            if st.st_size: mm.close()
+
+    order = array("I")
+    starts = array("Q", [0])
+    for m in members:
+        order.extend(m)
+        starts.append(len(order))
+    strata_json = json.dumps([json.loads(k) for k in strata]).encode("utf-8")
+
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp = index_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_header.pack(
+            _magic, st.st_size, st.st_mtime_ns, len(spans) // 2, len(members), len(strata_json), digest
+        ))
+        f.write(spans.tobytes())
+        f.write(order.tobytes())
+        f.write(starts.tobytes())
+        f.write(strata_json)
+    os.replace(tmp, index_path)
+
+
+def _digest(path: str) -> bytes:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20): h.update(chunk)
+    return h.digest()
+
+
+def default_index_path(source_path: str) -> str:
+    # keyed on a cheap fingerprint of the contents (size, first and last 64k), not the path or mtime: a
+    # pyinstaller onefile build unpacks the data to a new directory (with fresh mtimes) on every launch, and
+    # should still find the index built last time. the index holds the full digest, checked by QuestionBank
+    h = hashlib.sha1()
+    with open(source_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        h.update(size.to_bytes(8, "little"))
+        h.update(f.read(_edge))
+        if size > _edge:
+            f.seek(max(_edge, size - _edge))
+            h.update(f.read(_edge))
+    return os.path.join(default_cache_dir, f"questions-{h.hexdigest()[:16]}.idx")
+
+
+class QuestionBank(Sequence[str]):
+    # a sequence of question texts (so random.choice works on it), plus tags and stratified sampling
+    def __init__(self, source_path: str, index_path: str | None = None):
+        self.source_path = source_path
+        self.index_path = index_path or default_index_path(source_path)
+        if not self._index_valid(): build_index(self.source_path, self.index_path)
+
+        self._source_file = open(source_path, "rb")
+        size = os.fstat(self._source_file.fileno()).st_size
+        self._source = mmap.mmap(self._source_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self._index_file = open(self.index_path, "rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, n, k, strata_len, _ = _header.unpack_from(self._index, 0)
+        view = memoryview(self._index)
+        at = _header.size
+        self._spans = view[at:at + 16 * n].cast("Q")
+        at += 16 * n
+        self._order = view[at:at + 4 * n].cast("I")
+        at += 4 * n
+        self._starts = view[at:at + 8 * (k + 1)].cast("Q")
+        at += 8 * (k + 1)
+        self.strata: list[dict[str, str]] = json.loads(bytes(view[at:at + strata_len]))
+        self._n = n
+
+    def _index_valid(self) -> bool:
+        # same size and mtime as when built: trusted as is. same size, other mtime (a fresh copy, or an edit):
+        # only then is the source hashed, and the new mtime recorded if the contents are the same
+        try:
+            st = os.stat(self.source_path)
+            with open(self.index_path, "rb") as f:
+                magic, size, mtime, *_, digest = _header.unpack(f.read(_header.size))
+        except (OSError, struct.error):
+            return False
+        if magic != _magic or size != st.st_size: return False
+        if mtime == st.st_mtime_ns: return True
+        try:
+            if _digest(self.source_path) != digest: return False
+            with open(self.index_path, "r+b") as f:
+                f.seek(_mtime_offset)
+                f.write(struct.pack("<Q", st.st_mtime_ns))
+        except OSError:
+            pass
+        return True
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _line(self, i: int) -> bytes:
+        if i < 0: i += self._n
+        if not 0 <= i < self._n: raise IndexError(i)
+        return self._source[self._spans[2 * i]:self._spans[2 * i + 1]]
+
+    def __getitem__(self, i: int) -> str:
+        return self._line(i).split(b"\t", 1)[0].decode("utf-8", "replace").strip()
+
+    def tags(self, i: int) -> dict[str, str]:
+        parts = self._line(i).split(b"\t", 1)
+        return _parse_tags(parts[1].rstrip(b"\r")) if len(parts) > 1 else {}
+
+    def groups(self, by: Sequence[str]) -> dict[tuple, list[int]]:
+        # strata ids grouped by the values of the given tag keys (None where a question lacks the tag)
+        out: dict[tuple, list[int]] = {}
+        for s, tags in enumerate(self.strata):
+            out.setdefault(tuple(tags.get(k) for k in by), []).append(s)
+        return out
+
+    def _stratum_size(self, s: int) -> int:
+        return self._starts[s + 1] - self._starts[s]
+
+    def _pick(self, strata_ids: list[int], rnd: random.Random, taken: set[int]) -> int | None:
+        # uniform over the questions of the given strata, without repeating taken ones
+        sizes = [self._stratum_size(s) for s in strata_ids]
+        total = sum(sizes)
+        if not total: return None
+        for _ in range(32):
+            r = rnd.randrange(total)
+            for s, size in zip(strata_ids, sizes):
+                if r < size: break
+                r -= size
+            i = self._order[self._starts[s] + r]
+            if i not in taken: return i
+        # mostly taken already, pick from what is left
+        left = [
+            i for s in strata_ids
+            for i in self._order[self._starts[s]:self._starts[s + 1]] if i not in taken
+        ]
+        return rnd.choice(left) if left else None
+
+    def sample_stratified(
+            self, k: int, by: Sequence[str] = ("subject", "difficulty"),
+            rnd: random.Random | None = None, proportional: bool = False
+    ) -> list[int]:
+        # k question indices spread over the groups of the given tags: equally (round robin over shuffled
+        # groups), or proportionally to group size. no question is picked twice while any is left
+        rnd = rnd or random
+        groups = list(self.groups(by).values())
+        if not groups or not self._n: return []
+        k = min(k, self._n)
+        taken: set[int] = set()
+        out: list[int] = []
+        if proportional:
+            every = [s for g in groups for s in g]
+            while len(out) < k:
+                i = self._pick(every, rnd, taken)
+                if i is None: break
+                taken.add(i)
+                out.append(i)
+            return out
+        rnd.shuffle(groups)
+        while len(out) < k:
+            progressed = False
+            for g in groups:
+                if len(out) >= k: break
+                i = self._pick(g, rnd, taken)
+                if i is None: continue
+                taken.add(i)
+                out.append(i)
+                progressed = True
+            if not progressed: break
+        return out
+
+    def close(self):
+        self._spans.release()
+        self._order.release()
+        self._starts.release()
+        self._index.close()
+        self._index_file.close()
+        if isinstance(self._source, mmap.mmap): self._source.close()
+        self._source_file.close()
@@ -0,0 +1,196 @@
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+
+# client side flow control for gemini calls, shared by every caller of one AsyncLLMClient (all on its loop):
+# - token buckets for the requests-per-minute and tokens-per-minute quota
+# - an adaptive concurrency limit (aimd): halved on 429/503, grown back by one after a window of successes,
+#   plus a shared cool-down so callers back off together instead of each retrying on its own
+# - a circuit breaker that fails fast while upstream is down, and lets a single probe through after a while
+
+_overload = re.compile(r"overloaded|429|503|RESOURCE_EXHAUSTED|UNAVAILABLE", re.I)
+
+
+def is_overload(e: BaseException) -> bool:
+    # quota exhausted or upstream overloaded: worth retrying later, and a reason to slow down
+    return getattr(e, "code", None) in (429, 503) or bool(_overload.search(str(e)))
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    # counts against the circuit breaker: overload, server errors, connection problems and timeouts
+    code = getattr(e, "code", None)
+    return (
+            is_overload(e) or (isinstance(code, int) and code >= 500)
+            or isinstance(e, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+    )
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket:
+    # rate tokens per second, up to capacity. may go into debt (see QuotaScheduler.record)
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._t = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def delay(self, n: float) -> float:
+        # seconds until n tokens are there (0 if they are)
+        self._refill()
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float):
+        self._refill()
+        self.tokens -= n
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None: return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def check(self):
+        # raises while open; once reset_timeout has passed, lets exactly one probe call through
+        state = self.state
+        if state == "closed": return
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"gemini circuit open after {self.failures} failures, failing fast")
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        probe, self._probing = self._probing, False
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self.trips += 1
+            self.opened_at = time.monotonic()
+        elif probe:
+            # the probe failed too: stay open for another reset_timeout
+            self.opened_at = time.monotonic()
+
+    def abandon(self):
+        # a call ended without telling anything about upstream (e.g. cancelled)
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
+
+
+class QuotaScheduler:
+    def __init__(
+            self, max_concurrency: int = 4, rpm: float | None = None, tpm: float | None = None,
+            min_concurrency: int = 1, cooldown: float = 1.0, max_cooldown: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        # bursts of at most a second's worth: a full minute's burst on top of the refill would overrun
+        # a per-minute quota that upstream counts over a sliding window
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60)) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, tpm / 60) if tpm else None
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.active = 0
+        self._cooldown = cooldown
+        self._paused_until = 0.0
+        self._successes = 0
+        self._cond: asyncio.Condition | None = None
+
+        self.overloads = 0
+        self.waited = 0.0
+
+    def _condition(self) -> asyncio.Condition:
+        # created lazily so it belongs to the loop thread
+        if self._cond is None: self._cond = asyncio.Condition()
+        return self._cond
+
+    def _delay(self, tokens: float) -> float:
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.requests: delay = max(delay, self.requests.delay(1))
+        if self.tokens: delay = max(delay, self.tokens.delay(tokens))
+        return delay
+
+    async def acquire(self, tokens: float = 0):
+        start = time.monotonic()
+        cond = self._condition()
+        async with cond:
+            while True:
+                if self.active < self.limit:
+                    delay = self._delay(tokens)
+                    if delay <= 0: break
+                    # sleep outside the lock, with the slot check redone afterwards
+                    cond.release()
+                    try:
+                        await asyncio.sleep(delay)
+                    finally:
+                        await cond.acquire()
+                    continue
+                await cond.wait()
+            self.active += 1
+            if self.requests: self.requests.take(1)
+            if self.tokens: self.tokens.take(tokens)
+        self.waited += time.monotonic() - start
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.active -= 1
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, tokens: float = 0):
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def record(self, estimated: float, used: int | None):
+        # success: settle the token estimate, and grow concurrency back by one per window of successes
+        if self.tokens and used is not None: self.tokens.take(used - estimated)
+        self._cooldown = self.base_cooldown
+        self._successes += 1
+        if self.limit < self.max_concurrency and self._successes >= self.limit:
+            self._successes = 0
+            self.limit += 1
+
+    def overloaded(self):
+        # 429/503: halve concurrency, and pause everyone for a growing cool-down
+        self.overloads += 1
+        self._successes = 0
+        self.limit = max(self.min_concurrency, self.limit // 2)
+        self._paused_until = max(self._paused_until, time.monotonic() + self._cooldown)
+        self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit, "active": self.active, "overloads": self.overloads,
+            "waited_s": round(self.waited, 3),
+        }
@@ -0,0 +1,15 @@
+import os
+import sys
+
+
+def resource_path(relative_path):
+    if hasattr(sys, "_MEIPASS"):
+        # PyInstaller temp folder
+        base_path = sys._MEIPASS
+    else:
+        # Running from source
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+data_dir_path = resource_path("data/")
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+from importlib.abc import MetaPathFinder, Loader
+from importlib.machinery import ModuleSpec
+
+# startup timing: import-time breakdown and milestones (e.g. time to first frame).
+# stdlib only, so it can be installed before anything heavy is imported.
+# the report is emitted when WM_STARTUP_REPORT is set: "1" prints it, anything else is a file path to write to.
+
+_t0 = time.perf_counter()
+_marks: list[tuple[str, float]] = []
+_imports: dict[str, float] = {}
+_stack: list[list[float]] = []
+
+
+def process_start_offset() -> float | None:
+    # seconds between process creation and this module's import, i.e. interpreter boot, the pyinstaller
+    # bootloader unpacking to _MEIPASS, and the first imports. None where it can't be determined
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+            creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.kernel32.GetProcessTimes(
+                    handle, ctypes.byref(creation), ctypes.byref(exit_), ctypes.byref(kernel), ctypes.byref(user)
+            ):
+                return None
+            # FILETIME: 100ns ticks since 1601
+            ticks = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+            created = ticks / 1e7 - 11644473600
+        elif os.path.exists("/proc/self/stat"):
+            with open("/proc/self/stat", "rt") as f:
+                start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+            with open("/proc/uptime", "rt") as f:
+                uptime = float(f.read().split()[0])
+            created = time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+        else:
+            return None
+    except Exception:
+        return None
+    return time.time() - (time.perf_counter() - _t0) - created
+
+
+class _TimedLoader(Loader):
+    def __init__(self, loader: Loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # self time: nested imports are subtracted from their parent
+        _stack.append([time.perf_counter(), 0.0])
+        try:
+            self.loader.exec_module(module)
+        finally:
+            start, nested = _stack.pop()
+            total = time.perf_counter() - start
+            _imports[module.__name__] = total - nested
+            if _stack: _stack[-1][1] += total
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _ImportTimer(MetaPathFinder):
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"): continue
+            spec: ModuleSpec | None = finder.find_spec(name, path, target)
+            if spec is None: continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader)
+            return spec
+        return None
+
+
+_timer: _ImportTimer | None = None
+
+
+def begin():
+    # call before the heavy imports. cheap no-op when no report was asked for
+    global _timer
+    if not os.environ.get("WM_STARTUP_REPORT") or _timer is not None: return
+    _timer = _ImportTimer()
+    sys.meta_path.insert(0, _timer)
+
+
+def mark(name: str):
+    _marks.append((name, time.perf_counter() - _t0))
+
+
+def report(top: int = 25) -> str:
+    lines = ["startup report", f"frozen build: {hasattr(sys, '_MEIPASS')}"]
+    offset = process_start_offset()
+    if offset is not None: lines.append(f"{offset * 1e3:9.1f} ms  process start -> startup profiler")
+    for name, t in _marks:
+        lines.append(f"{t * 1e3:9.1f} ms  {name}")
+    if _imports:
+        # group by top level package
+        packages: dict[str, float] = {}
+        for m, t in _imports.items():
+            p = m.split(".")[0]
+            packages[p] = packages.get(p, 0.0) + t
+        lines.append(f"imports: {len(_imports)} modules, {sum(_imports.values()) * 1e3:.1f} ms")
+        for p, t in sorted(packages.items(), key=lambda i: -i[1])[:top]:
+            lines.append(f"{t * 1e3:9.1f} ms  {p}")
+    return "\n".join(lines)
+
+
+def emit():
+    target = os.environ.get("WM_STARTUP_REPORT")
+    if not target: return
+    if _timer is not None: sys.meta_path.remove(_timer)
+    text = report()
+    if target == "1":
+        print(text)
+        return
+    with open(target, "wt", encoding="utf-8") as f:
+        f.write(text + "\n")
@@ -0,0 +1,46 @@
+import uuid
+
+from services.writer import WriteBehindWriter, server_timestamp, updated_field
+
+# answer rules shared by the tk pages (ui/detect.py) and the web study (server.py)
+min_word_count = 100
+min_response_chars = 30
+
+
+class SurveySession:
+    # with a writer, saves are queued (write-behind) instead of blocking the tk thread on a firestore round trip,
+    # and db is only needed by the writer (which also accepts a future of it)
+    def __init__(self, db, user_id: str, writer: WriteBehindWriter | None = None):
+        self.db = db
+        self.writer = writer
+        self.session_id = str(uuid.uuid4())
+        self.user_id = user_id
+
+        self.path = f"responses/{self.session_id}"
+
+        self._set(self.path, {
+            "user_id": user_id,
+        })
+
+    @property
+    def ref(self):
+        return (self.writer.db if self.writer else self.db).document(self.path)
+
+    def _set(self, path: str, data: dict):
+        if self.writer: self.writer.set(path, data)
+        else: self.db.document(path).set({**data, updated_field: server_timestamp(self.db)})
+
+    def _update(self, path: str, data: dict):
+        if self.writer: self.writer.update(path, data)
+        else: self.db.document(path).update({**data, updated_field: server_timestamp(self.db)})
+
+    def save_demographics(self, data: dict):
+        self._update(self.path, {
+            "demographics": data,
+        })
+
+    def save_question(self, page_index: int, data: dict):
+        self._set(f"{self.path}/pages/{page_index}", {
+            **data,
+            "page_index": page_index
+        })
@@ -0,0 +1,90 @@
+import struct
+import sys
+import time
+from array import array
+
+# per-page interaction telemetry: keystrokes, focus changes, scrolls, radio toggles and page visibility,
+# recorded into a fixed-size ring buffer (the most recent `capacity` events are kept) and saved as one packed
+# blob in the page document. recording is two array stores, so it can run on every key event.
+#
+# an event code is one byte: kind << 4 | target.
+# blob layout (little endian): header struct "<4sBIII" (magic, version, events, dropped, elapsed ms),
+# then the timestamps as uint32 ms since the recorder's origin, then the event codes as uint8, oldest first.
+
+KEY, FOCUS_IN, FOCUS_OUT, SCROLL, TOGGLE, SUBMIT, RESPONSE, SHOWN, HIDDEN = range(1, 10)
+kinds = ("", "key", "focus_in", "focus_out", "scroll", "toggle", "submit", "response", "shown", "hidden")
+
+PAGE, QUERY, RESPONSE_TEXT, REASONING, ACTION, WM_YES, WM_NO = range(7)
+targets = ("page", "query", "response_text", "reasoning", "action", "wm_yes", "wm_no")
+
+_magic = b"WMT1"
+_version = 1
+_header = struct.Struct("<4sBIII")
+
+
+def code(kind: int, target: int = PAGE) -> int:
+    return kind << 4 | target
+
+
+class EventRecorder:
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.times = array("I", bytes(4 * capacity))
+        self.codes = array("B", bytes(capacity))
+        # events recorded so far, including the ones the ring has overwritten
+        self.count = 0
+        # perf_counter: monotonic, and finer grained than time.monotonic on windows
+        self.origin = time.perf_counter()
+
+    def record(self, event_code: int):
+        i = self.count % self.capacity
+        self.times[i] = int((time.perf_counter() - self.origin) * 1000) & 0xFFFFFFFF
+        self.codes[i] = event_code
+        self.count += 1
+
+    def _ordered(self) -> tuple[array, array]:
+        n = min(self.count, self.capacity)
+        if self.count <= self.capacity: return self.times[:n], self.codes[:n]
+        i = self.count % self.capacity
+        return self.times[i:] + self.times[:i], self.codes[i:] + self.codes[:i]
+
+    def events(self) -> list[tuple[int, int]]:
+        # (ms, code), oldest first
+        times, codes = self._ordered()
+        return list(zip(times, codes))
+
+    def pack(self) -> bytes:
+        times, codes = self._ordered()
+        if sys.byteorder != "little": times.byteswap()
+        elapsed = int((time.perf_counter() - self.origin) * 1000) & 0xFFFFFFFF
+        header = _header.pack(_magic, _version, len(codes), self.count - len(codes), elapsed)
+        return header + times.tobytes() + codes.tobytes()
+
+
+def unpack(blob: bytes) -> dict:
+    # for analysis: the packed blob back as {"elapsed_ms", "dropped", "events": [(ms, kind, target), ...]}
+    magic, version, n, dropped, elapsed = _header.unpack_from(blob)
+    if magic != _magic or version != _version: raise ValueError("not a telemetry blob")
+    times = array("I")
+    times.frombytes(blob[_header.size:_header.size + 4 * n])
+    if sys.byteorder != "little": times.byteswap()
+    codes = blob[_header.size + 4 * n:_header.size + 5 * n]
+    return {
+        "elapsed_ms": elapsed, "dropped": dropped,
+        "events": [(t, kinds[c >> 4], targets[c & 0xF]) for t, c in zip(times, codes)],
+    }
+
+
+def watch(recorder: EventRecorder, widget, target: int, keys: bool = True, scroll: bool = False):
+    # records key presses, focus changes and (optionally) wheel scrolls on a tk widget,
+    # added to its existing bindings
+    def bind(sequence: str, kind: int):
+        c = code(kind, target)
+        widget.bind(sequence, lambda e: recorder.record(c), add="+")
+
+    if keys: bind("<KeyPress>", KEY)
+    bind("<FocusIn>", FOCUS_IN)
+    bind("<FocusOut>", FOCUS_OUT)
+    if scroll:
+        # windows/mac wheel, x11 wheel
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"): bind(sequence, SCROLL)
@@ -0,0 +1,183 @@
+import atexit
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# lightweight tracing of the query -> llm -> watermark -> render path. stdlib only.
+# a Trace is one participant query, its spans are the timed stages, started and ended on whichever thread runs
+# the stage (tk, the llm loop, scheduler workers). every finished span lands in a per-stage latency histogram,
+# and in the exporter when there is one: WM_TRACE="1" keeps the last spans in memory, anything else is the path
+# of a jsonl file to append them to. with WM_TRACE set, the histograms are also printed at exit.
+
+_ids = itertools.count(1)
+
+
+class Histogram:
+    # log-spaced buckets, in ms. quantiles are bucket upper bounds (capped at the max seen)
+    bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.n += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q: float) -> float:
+        if not self.n: return 0.0
+        rank = q * self.n
+        for i, c in enumerate(itertools.accumulate(self.counts)):
+            if c >= rank: return min(float(self.bounds[i]), self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "n": self.n, "mean_ms": round(self.total / self.n, 1) if self.n else 0.0,
+            "p50_ms": self.quantile(0.5), "p90_ms": self.quantile(0.9), "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max, 1),
+        }
+
+
+class Span:
+    __slots__ = ("trace", "name", "start", "end_time", "attrs")
+
+    def __init__(self, trace: "Trace", name: str, start: float | None = None, **attrs):
+        self.trace = trace
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end_time: float | None = None
+        self.attrs = attrs
+
+    @property
+    def ms(self) -> float:
+        end = time.perf_counter() if self.end_time is None else self.end_time
+        return (end - self.start) * 1e3
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, **attrs):
+        # only the first end counts
+        if self.end_time is not None: return
+        self.attrs.update(attrs)
+        self.end_time = time.perf_counter()
+        self.trace._finished(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None: self.attrs["error"] = repr(exc)
+        self.end()
+
+
+class Trace:
+    def __init__(self, tracer: "Tracer | None", name: str, keep_spans: bool = True, **attrs):
+        self.tracer = tracer
+        self.keep_spans = keep_spans
+        self.id = f"{os.getpid():x}-{next(_ids):x}"
+        self.root = Span(self, name, **attrs)
+        self.spans: list[Span] = []
+        # end of the latest finished stage, where the hop to the next one starts
+        self.last_end = self.root.start
+
+    def span(self, name: str, start: float | None = None, **attrs) -> Span:
+        s = Span(self, name, start, **attrs)
+        if self.keep_spans: self.spans.append(s)
+        return s
+
+    def end(self, **attrs):
+        self.root.end(**attrs)
+
+    def _finished(self, span: Span):
+        if span.end_time > self.last_end: self.last_end = span.end_time
+        if self.tracer is not None: self.tracer._record(self, span)
+
+    def timings(self) -> dict:
+        # flat per-query record for the session: ms per stage (summed over repeats) plus the stage attributes
+        record = {"total_ms": round(self.root.ms, 1)}
+        for s in self.spans:
+            if s.end_time is None: continue
+            record[f"{s.name}_ms"] = round(record.get(f"{s.name}_ms", 0.0) + s.ms, 1)
+            record.update(s.attrs)
+        record.update(self.root.attrs)
+        return record
+
+
+class MemoryExporter:
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque[dict] = deque(maxlen=max_spans)
+
+    def export(self, record: dict):
+        self.spans.append(record)
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "at", encoding="utf-8", buffering=1)
+
+    def export(self, record: dict):
+        self._f.write(json.dumps(record, default=str) + "\n")
+
+
+_token_attrs = ("prompt_tokens", "output_tokens", "total_tokens")
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self.histograms: dict[str, Histogram] = {}
+        self.tokens = dict.fromkeys(_token_attrs, 0)
+        self._lock = threading.Lock()
+
+    def trace(self, name: str, **attrs) -> Trace:
+        return Trace(self, name, **attrs)
+
+    def _record(self, trace: Trace, span: Span):
+        ms = span.ms
+        with self._lock:
+            h = self.histograms.get(span.name)
+            if h is None: h = self.histograms[span.name] = Histogram()
+            h.observe(ms)
+            for k in _token_attrs:
+                self.tokens[k] += span.attrs.get(k) or 0
+            if self.exporter is None: return
+            self.exporter.export({
+                "trace": trace.id, "span": span.name,
+                "offset_ms": round((span.start - trace.root.start) * 1e3, 3), "ms": round(ms, 3),
+                **span.attrs,
+            })
+
+    def report(self) -> str:
+        with self._lock:
+            lines = ["trace report"]
+            for name, h in sorted(self.histograms.items()):
+                s = h.summary()
+                lines.append(
+                    f"{name:>16}  n {s['n']:6}  mean {s['mean_ms']:9.1f}  p50 {s['p50_ms']:7.0f}  "
+                    f"p90 {s['p90_ms']:7.0f}  p99 {s['p99_ms']:7.0f}  max {s['max_ms']:9.1f} ms"
+                )
+            lines.append("tokens: " + ", ".join(f"{k} {v}" for k, v in self.tokens.items()))
+            return "\n".join(lines)
+
+
+def _exporter():
+    target = os.environ.get("WM_TRACE")
+    if not target: return None
+    return MemoryExporter() if target == "1" else JsonlExporter(target)
+
+
+tracer = Tracer(_exporter())
+# for calls outside any query (e.g. the acrostic rewrite inside a mark): counted in the histograms, not kept
+untraced = Trace(tracer, "untraced", keep_spans=False)
+if tracer.exporter is not None: atexit.register(lambda: print(tracer.report()))
@@ -0,0 +1,157 @@
+from typing import Callable, Iterable
+
+Watermark = Callable[[str], str]
+
+# the space codepoints used by the space-replace mark, U+2004-U+2008
+space_codepoints = [0x2004, 0x2005, 0x2006, 0x2007, 0x2008]
+
+
+# character-level watermark: a fixed (or per-call sampled) codepoint substitution, optionally upper-casing.
+# consecutive char marks are fused by WatermarkPipeline into a single composed substitution where that pays off.
+class CharMark:
+    def __init__(
+            self, table: dict[str, str] | None = None, upper: bool = False,
+            sample: Callable[[], dict[str, str]] | None = None
+    ):
+        self.table = table or {}
+        self.upper = upper
+        self.sample = sample
+        # compiled once per distinct table: the fixed one, or each one the sampler has produced so far
+        self._compiled: dict[tuple, Substitution] = {}
+
+    def resolve(self) -> dict[str, str]:
+        return self.sample() if self.sample else self.table
+
+    def substitution(self, table: dict[str, str]) -> "Substitution":
+        key = tuple(table.items())
+        sub = self._compiled.get(key)
+        if sub is None:
+            # a sampler with unbounded outcomes would grow this forever
+            if len(self._compiled) >= 256: self._compiled.clear()
+            sub = self._compiled[key] = Substitution(table)
+        return sub
+
+    def frozen(self) -> "CharMark":
+        # same mark with its sample fixed, so it can be applied chunk by chunk consistently
+        return CharMark(self.resolve(), upper=self.upper) if self.sample else self
+
+    def __call__(self, s: str) -> str:
+        if self.upper: s = s.upper()
+        table = self.resolve()
+        return self.substitution(table)(s) if table else s
+
+
+def compose_tables(a: dict[str, str], b: dict[str, str]) -> dict[str, str]:
+    # c -> a[c] -> b applied on every char of a[c]
+    out = {c: "".join(b.get(x, x) for x in s) for c, s in a.items()}
+    for c, s in b.items():
+        if c not in out: out[c] = s
+    return {c: s for c, s in out.items() if c != s}
+
+
+# a composed substitution table, applied as one simultaneous substitution.
+# str.translate is only fast for ascii text with a 1:1 ascii table (bench: ~10x slower than str.replace otherwise),
+# so outside of that case it runs as a chain of replaces ordered such that no replacement is substituted again.
+class Substitution:
+    def __init__(self, table: dict[str, str]):
+        self.table = table
+        self.translate_table = str.maketrans(table)
+        self.ascii_1to1 = all(c.isascii() and len(r) == 1 and r.isascii() for c, r in table.items())
+        self.plan = self._order(table)
+
+    @staticmethod
+    def _order(table: dict[str, str]) -> list[tuple[str, str]] | None:
+        # key c must be replaced before any key whose replacement contains c. None if that is cyclic
+        before = {c: {d for d in table if d != c and d in r} for c, r in table.items()}
+        plan = []
+        while before:
+            ready = [c for c, deps in before.items() if not deps]
+            if not ready: return None
+            for c in ready:
+                plan.append((c, table[c]))
+                del before[c]
+            for deps in before.values():
+                deps.difference_update(ready)
+        return plan
+
+    def __call__(self, s: str) -> str:
+        if self.plan is None or (self.ascii_1to1 and s.isascii()):
+            return s.translate(self.translate_table)
+        for c, r in self.plan:
+            s = s.replace(c, r)
+        return s
+
+
+# a run of char marks. fused into composed passes only when every pass takes the str.translate path (fixed
+# tables, ascii 1:1): that saves a scan of the text per mark. anything else (sampled tables, multi-char or
+# non-ascii replacements) gains nothing from composing, so the marks run one after another as they are.
+class _FusedStage:
+    def __init__(self, marks: list[CharMark]):
+        self.marks = marks
+        self._passes = None
+        if all(m.sample is None for m in marks):
+            passes = self._compile([m.table for m in marks])
+            if all(p is None or p.ascii_1to1 for p in passes): self._passes = passes
+
+    def _compile(self, tables: list[dict[str, str]]) -> list:
+        # passes are either a substitution or None for upper-casing
+        passes = []
+        current: dict[str, str] = {}
+        for m, table in zip(self.marks, tables):
+            if m.upper:
+                if current: passes.append(Substitution(current))
+                passes.append(None)
+                current = {}
+            current = compose_tables(current, table)
+        if current: passes.append(Substitution(current))
+        return passes
+
+    def __call__(self, s: str) -> str:
+        if self._passes is None:
+            for m in self.marks:
+                s = m(s)
+            return s
+        for p in self._passes:
+            s = s.upper() if p is None else p(s)
+        return s
+
+
+def streamable(mark: Watermark | None) -> Watermark | None:
+    # a mark that gives the same result applied per streamed chunk as on the whole text, if there is one.
+    # only char marks are context free; anything else (e.g. acrostic) needs the full text
+    if mark is None: return lambda s: s
+    if isinstance(mark, CharMark): return mark.frozen()
+    return None
+
+
+# applies a sequence of watermarks in order.
+# runs of char-level marks are merged into one pass; any other mark (e.g. LLM based) runs as its own stage.
+class WatermarkPipeline:
+    def __init__(self, marks: Iterable[Watermark]):
+        self.stages: list[Watermark] = []
+        run: list[CharMark] = []
+        for mark in marks:
+            if isinstance(mark, CharMark):
+                run.append(mark)
+                continue
+            if run: self.stages.append(self._fuse(run))
+            run = []
+            self.stages.append(mark)
+        if run: self.stages.append(self._fuse(run))
+
+    @staticmethod
+    def _fuse(run: list[CharMark]) -> Watermark:
+        # a lone mark has nothing to fuse with
+        return run[0] if len(run) == 1 else _FusedStage(run)
+
+    def __call__(self, text: str) -> str:
+        for stage in self.stages:
+            text = stage(text)
+        return text
+
+    def apply_batch(self, texts: Iterable[str]) -> list[str]:
+        if not self.stages: return list(texts)
+        if len(self.stages) == 1:
+            stage = self.stages[0]
+            return [stage(t) for t in texts]
+        return [self(t) for t in texts]
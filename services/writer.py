@@ -0,0 +1,267 @@
+import atexit
+import base64
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from services.cache import default_cache_dir
+
+default_journal_dir = os.path.join(default_cache_dir, "journal")
+
+# firestore rejects batches of more than 500 writes
+max_batch_writes = 500
+
+
+# every committed write stamps this field with the server's commit time, so exports can sync incrementally
+# (see export.py)
+updated_field = "updated_at"
+
+
+def server_timestamp(db):
+    # firestore's SERVER_TIMESTAMP sentinel, or the db's own (bench.fakes.FakeFirestore)
+    stamp = getattr(db, "SERVER_TIMESTAMP", None)
+    if stamp is None: from google.cloud.firestore import SERVER_TIMESTAMP as stamp
+    return stamp
+
+
+# errors a retry can't fix: firestore rejected the write itself (google.api_core.exceptions names, matched by
+# name so api_core isn't imported here), or the client couldn't even encode it. anything else, e.g.
+# unavailable / deadline exceeded / no credentials yet, is retried
+_permanent_errors = {"InvalidArgument", "NotFound", "AlreadyExists", "FailedPrecondition", "OutOfRange"}
+
+
+def permanent(e: Exception) -> bool:
+    return type(e).__name__ in _permanent_errors or isinstance(e, (TypeError, ValueError))
+
+
+def _encode(o):
+    # bytes values (e.g. packed page telemetry) go through the journal as base64
+    if isinstance(o, bytes): return {"$bytes": base64.b64encode(o).decode("ascii")}
+    return str(o)
+
+
+def _decode(d: dict):
+    return base64.b64decode(d["$bytes"]) if d.keys() == {"$bytes"} else d
+
+
+# write-behind firestore writer: set/update calls return immediately, and are committed in batches on a
+# background thread. every write is first appended (and fsynced) to a local journal, which is replayed on the
+# next start if the process dies before the write was committed.
+# works against the firestore emulator as is (FIRESTORE_EMULATOR_HOST), see bench/writer.py.
+# db may also be a Future of the client, or a function returning the client or a Future of it (firebase.prewarm),
+# resolved on the writer thread. a function is called again on every commit attempt, so a failed initialization
+# is retried rather than re-raised forever.
+# a batch failing with a permanent error (see permanent) is split to find the write(s) at fault, which are
+# dead-lettered: kept, with the error, in dead-letters.log next to the journal, and no longer block the queue.
+class WriteBehindWriter:
+    def __init__(
+            self, db, journal_dir: str = default_journal_dir,
+            flush_interval: float = 0.5, max_batch: int = max_batch_writes,
+            retry_delay: float = 1.0, max_retry_delay: float = 30.0,
+    ):
+        self._db = db
+        self.flush_interval = flush_interval
+        self.max_batch = min(max_batch, max_batch_writes)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._pending: list[dict] = []
+        self._seq = 0
+        self._in_flight = 0
+        self._closed = False
+        self._flushing = False
+        self._cond = threading.Condition()
+
+        self.commits = 0
+        self.failures = 0
+        self.dead = 0
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self.journal_path = os.path.join(journal_dir, f"{uuid.uuid4()}.jsonl")
+        # not *.jsonl: never replayed as a journal
+        self.dead_letter_path = os.path.join(journal_dir, "dead-letters.log")
+        self._journal = open(self.journal_path, "at", encoding="utf-8")
+        self._recover(journal_dir)
+
+        self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # journal
+
+    def _append(self, entries: list[dict]):
+        for e in entries:
+            self._journal.write(json.dumps(e, default=_encode) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _recover(self, journal_dir: str):
+        # take over unacknowledged writes from journals left behind by earlier runs.
+        # assumes one app instance per journal dir at a time (as on the lab machines)
+        for path in sorted(glob.glob(os.path.join(journal_dir, "*.jsonl"))):
+            if path == self.journal_path: continue
+            ops, acked = [], set()
+            try:
+                with open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            e = json.loads(line, object_hook=_decode)
+                        except ValueError:
+                            continue  # torn last line
+                        if "ack" in e: acked.update(e["ack"])
+                        else: ops.append(e)
+            except OSError as e:
+                print(f"writer: could not read journal {path}: {e}")
+                continue
+            ops = [op for op in ops if op["seq"] not in acked]
+            if ops: print(f"writer: recovering {len(ops)} writes from {path}")
+            with self._cond:
+                for op in ops:
+                    self._seq += 1
+                    op["seq"] = self._seq
+                    self._pending.append(op)
+                self._append(ops)
+            os.remove(path)
+
+    # writes
+
+    def _enqueue(self, op: dict):
+        with self._cond:
+            if self._closed: raise RuntimeError("writer is closed")
+            self._seq += 1
+            op["seq"] = self._seq
+            self._append([op])
+            self._pending.append(op)
+            self._cond.notify()
+
+    def set(self, path: str, data: dict, merge: bool = False):
+        self._enqueue({"op": "set", "path": path, "data": data, "merge": merge})
+
+    def update(self, path: str, data: dict):
+        self._enqueue({"op": "update", "path": path, "data": data})
+
+    @property
+    def db(self):
+        db = self._db() if callable(self._db) else self._db
+        return db.result() if isinstance(db, Future) else db
+
+    # background commit loop
+
+    def _commit(self, db, ops: list[dict]) -> Exception | None:
+        # a permanent error of the writes themselves (encoding one, or the commit) is returned; anything else,
+        # e.g. from the client, is raised and retried
+        batch = db.batch()
+        # stamped here rather than in set/update: the sentinel can't go through the journal
+        stamp = {updated_field: server_timestamp(db)}
+        try:
+            for op in ops:
+                ref = db.document(op["path"])
+                if op["op"] == "update":
+                    batch.update(ref, {**op["data"], **stamp})
+                else:
+                    batch.set(ref, {**op["data"], **stamp}, merge=op.get("merge", False))
+            batch.commit()
+        except Exception as e:
+            if not permanent(e): raise
+            return e
+        return None
+
+    def _commit_isolating(self, db, ops: list[dict]) -> list[tuple[dict, Exception]]:
+        # commits ops, halving any batch that fails permanently down to the single writes at fault, which are
+        # returned. a retryable error is raised, and the whole batch retried: halves committed before it are
+        # committed again, harmless as every write is a whole set / update of its document
+        e = self._commit(db, ops)
+        if e is None: return []
+        if len(ops) == 1: return [(ops[0], e)]
+        mid = len(ops) // 2
+        return self._commit_isolating(db, ops[:mid]) + self._commit_isolating(db, ops[mid:])
+
+    def _dead_letter(self, dead: list[tuple[dict, Exception]]):
+        self.dead += len(dead)
+        for op, e in dead:
+            print(f"writer: dropping {op['op']} of {op['path']}, see {self.dead_letter_path}: {e!r}")
+        with open(self.dead_letter_path, "at", encoding="utf-8") as f:
+            for op, e in dead:
+                f.write(json.dumps({**op, "error": repr(e), "time": time.time()}, default=_encode) + "\n")
+
+    def _run(self):
+        delay = self.retry_delay
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed: return
+                # give quick successive writes a moment to join the batch
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flushing) and len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0: break
+                    self._cond.wait(remaining)
+                ops = self._pending[:self.max_batch]
+                self._in_flight = len(ops)
+            try:
+                # resolved first: a client that fails to initialize is retried, never blamed on the writes
+                dead = self._commit_isolating(self.db, ops)
+            except Exception as e:
+                self.failures += 1
+                print(f"writer: batch of {len(ops)} failed, retrying in {delay:.1f}s: {e}")
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+                    if self._closed: return  # still in the journal, replayed on next start
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            delay = self.retry_delay
+            # before the ack: a crash in between replays (and dead-letters) them again, never loses them
+            if dead: self._dead_letter(dead)
+            with self._cond:
+                if self._journal.closed: return
+                del self._pending[:len(ops)]
+                self._in_flight = 0
+                self.commits += 1
+                self._append([{"ack": [op["seq"] for op in ops]}])
+                if not self._pending:
+                    self._flushing = False
+                    self._compact()
+                self._cond.notify_all()
+
+    def _compact(self):
+        # everything is committed, start the journal over
+        self._journal.truncate(0)
+        self._journal.seek(0)
+
+    # lifecycle
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        # blocks until every write so far is committed (or the timeout passes)
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing = bool(self._pending)
+            self._cond.notify_all()
+            while self._pending:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0: return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        if self._closed: return
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+        with self._cond:
+            self._journal.close()
+        if flushed: os.remove(self.journal_path)
+        else: print(f"writer: {self.pending()} writes left in journal {self.journal_path}")
+        atexit.unregister(self.close)
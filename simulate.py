@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from services import attacks
+from services.detection import score_batch, scorers
+from services.marks import char_marks
+
+# monte carlo robustness of the char marks against removal attacks (services/attacks.py):
+#   python simulate.py answers.jsonl -o sim/ --trials 5000000 --seed 7
+#   python simulate.py answers.jsonl -o sim/ --trials 10000000       # resumes, and extends the run
+# a trial picks a corpus text, a mark and a random non-empty set of attack operators (see `sampling`),
+# and records the mark's detector score of the marked text before and after the attack.
+# trials run in chunks over a process pool and are appended to sim/trials.bin (numpy records, see `record`) in
+# order, so a killed run resumes after its last whole chunk. each chunk has its own seed derived from --seed,
+# so a run (and any resumed part of it) is reproducible. sim/summary.json: per mark, the share of attacked
+# texts still detected at the given false positive rate on the clean corpus, overall and per operator.
+
+record = np.dtype([
+    ("trial", "<u8"), ("text", "<u4"), ("mark", "u1"), ("ops", "u1"), ("before", "<f4"), ("after", "<f4"),
+])
+
+# a trial's operators: one drawn uniformly, which it always has, plus each of the others independently with
+# probability p. a single draw per operator, however small p is
+sampling = "one uniform + others each with p"
+
+# everything that decides the trials; a resumed run must match it
+_keys = ("seed", "chunk", "marks", "ops", "p", "sampling", "corpus")
+
+# per worker process state, set up by _init
+_state: dict = {}
+
+
+def _load(path: str, fmt: str, field: str) -> list[str]:
+    src = sys.stdin if path == "-" else open(path, "rt", encoding="utf-8")
+    try:
+        if fmt == "text": return [line.rstrip("\r\n") for line in src if line.strip()]
+        records = (json.loads(line) for line in src if line.strip())
+        return [r[field] for r in records if isinstance(r, dict) and isinstance(r.get(field), str)]
+    finally:
+        if src is not sys.stdin: src.close()
+
+
+def _mark_all(texts: list[str], names: list[str], seed: int) -> dict[str, list[str]]:
+    # sampled marks (space-replace) draw from the global random: seeded, every worker marks alike
+    random.seed(seed)
+    return {n: [char_marks[n][0](t) for t in texts] for n in names}
+
+
+def _init(texts: list[str], config: dict):
+    marked = _mark_all(texts, config["marks"], config["seed"])
+    _state.update(
+        config=config,
+        corpus=attacks.Corpus(texts, [t for n in config["marks"] for t in marked[n]]),
+        marked=[marked[n] for n in config["marks"]],
+        before=[score_batch(marked[n], [n])[n].astype(np.float32) for n in config["marks"]],
+    )
+
+
+def _simulate(index: int) -> bytes:
+    config, corpus, marked, before = _state["config"], _state["corpus"], _state["marked"], _state["before"]
+    names, ops, p, size = config["marks"], config["ops"], config["p"], config["chunk"]
+    rng = random.Random(config["seed"] << 32 | index)
+    picks, attacked = [], []
+    for _ in range(size):
+        text, mark = rng.randrange(len(corpus.texts)), rng.randrange(len(names))
+        # see sampling
+        first = rng.randrange(len(ops))
+        mask = 1 << first | sum(1 << b for b in range(len(ops)) if b != first and rng.random() < p)
+        picks.append((text, mark, mask))
+        attacked.append(attacks.attack(marked[mark][text], mask, rng, corpus, ops))
+    out = np.zeros(size, dtype=record)
+    out["trial"] = np.arange(index * size, (index + 1) * size, dtype=np.uint64)
+    out["text"], out["mark"], out["ops"] = np.array(picks, dtype=np.int64).T
+    for m, name in enumerate(names):
+        rows = np.flatnonzero(out["mark"] == m)
+        if not len(rows): continue
+        out["before"][rows] = before[m][out["text"][rows]]
+        # all of a mark's attacked texts scored in one go
+        out["after"][rows] = scorers[name]([attacked[i] for i in rows])
+    return out.tobytes()
+
+
+def _resume(out_dir: str, config: dict, restart: bool) -> int:
+    # whole chunks already on disk (a partly written one is cut off), after checking the run is the same one
+    config_path, trials_path = os.path.join(out_dir, "config.json"), os.path.join(out_dir, "trials.bin")
+    if restart or not os.path.exists(config_path) or not os.path.exists(trials_path):
+        with open(config_path, "wt") as f:
+            json.dump(config, f, indent=1)
+        open(trials_path, "wb").close()
+        return 0
+    with open(config_path, "rt") as f:
+        previous = json.load(f)
+    changed = [k for k in _keys if previous.get(k) != config.get(k)]
+    if changed: raise ValueError(f"{out_dir} holds a different run (changed: {', '.join(changed)}), use --restart")
+    done = os.path.getsize(trials_path) // (record.itemsize * config["chunk"])
+    with open(trials_path, "r+b") as f:
+        f.truncate(done * record.itemsize * config["chunk"])
+    with open(config_path, "wt") as f:
+        json.dump(config, f, indent=1)
+    return done
+
+
+def run(texts: list[str], out_dir: str, config: dict, workers: int | None = None, restart: bool = False) -> int:
+    # appends the missing chunks of config["trials"] (rounded up to whole chunks) to trials.bin. returns trials run
+    os.makedirs(out_dir, exist_ok=True)
+    first = _resume(out_dir, config, restart)
+    last = -(-config["trials"] // config["chunk"])
+    if first >= last: return 0
+    workers = min(workers or os.cpu_count() or 1, last - first)
+    window = 2 * workers
+    pending = deque()
+    with open(os.path.join(out_dir, "trials.bin"), "ab") as out, \
+            ProcessPoolExecutor(workers, initializer=_init, initargs=(texts, config)) as pool:
+        for index in range(first, last):
+            pending.append(pool.submit(_simulate, index))
+            if len(pending) < window: continue
+            out.write(pending.popleft().result())
+            out.flush()
+        while pending:
+            out.write(pending.popleft().result())
+            out.flush()
+    return (last - first) * config["chunk"]
+
+
+def summarize(texts: list[str], out_dir: str, config: dict, fpr: float = 0.01) -> dict:
+    trials = np.fromfile(os.path.join(out_dir, "trials.bin"), dtype=record)
+    clean = score_batch(texts, config["marks"])
+    summary = {}
+    for m, name in enumerate(config["marks"]):
+        t = trials[trials["mark"] == m]
+        # detected: above the (1 - fpr) quantile of the clean texts' scores
+        threshold = float(np.quantile(clean[name], 1 - fpr)) if len(texts) else 0.0
+        before, after = t["before"] > threshold, t["after"] > threshold
+        summary[name] = {
+            "trials": len(t),
+            "threshold": threshold,
+            "score_before": float(t["before"].mean()) if len(t) else 0.0,
+            "score_after": float(t["after"].mean()) if len(t) else 0.0,
+            "detected_before": float(before.mean()) if len(t) else 0.0,
+            "detected_after": float(after.mean()) if len(t) else 0.0,
+            # with vs without each operator in the mix
+            "ops": {
+                op: {
+                    "with": float(after[t["ops"] >> b & 1 == 1].mean()) if (t["ops"] >> b & 1).any() else None,
+                    "without": float(after[t["ops"] >> b & 1 == 0].mean()) if (~t["ops"] >> b & 1).any() else None,
+                }
+                for b, op in enumerate(config["ops"])
+            },
+        }
+    with open(os.path.join(out_dir, "summary.json"), "wt") as f:
+        json.dump(summary, f, indent=1)
+    return summary
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="monte carlo robustness of the char marks against removal attacks")
+    parser.add_argument("input", help="clean corpus, jsonl or text file, - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="output directory (trials, config, summary)")
+    parser.add_argument("--format", choices=("jsonl", "text"), help="input format (default: from the extension)")
+    parser.add_argument("--field", default="text", help="record field holding the text")
+    parser.add_argument("--marks", nargs="+", default=list(char_marks), choices=list(char_marks))
+    parser.add_argument("--ops", nargs="+", default=list(attacks.operators), choices=list(attacks.operators))
+    parser.add_argument("--p", type=float, default=0.3, help="probability of each operator besides the one every trial has")
+    parser.add_argument("--trials", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=2000, help="trials per work item (and per resume point)")
+    parser.add_argument("--fpr", type=float, default=0.01, help="false positive rate of the summary's thresholds")
+    parser.add_argument("--workers", type=int, help="worker processes (default: cpu count)")
+    parser.add_argument("--restart", action="store_true", help="discard trials already in the output")
+    args = parser.parse_args(argv)
+    if len(args.ops) > 8: parser.error("at most 8 operators")
+    if not 0 <= args.p <= 1: parser.error("--p must be in [0, 1]")
+    if len(set(args.ops)) != len(args.ops) or len(set(args.marks)) != len(args.marks):
+        parser.error("operators and marks must be distinct")
+
+    fmt = args.format or ("text" if args.input.endswith(".txt") else "jsonl")
+    texts = _load(args.input, fmt, args.field)
+    if not texts: parser.error("no texts in the input")
+    corpus = hashlib.sha1("\0".join(texts).encode("utf-8")).hexdigest()
+    config = {
+        "seed": args.seed, "chunk": args.chunk, "marks": args.marks, "ops": args.ops, "p": args.p,
+        "sampling": sampling, "corpus": corpus, "trials": args.trials,
+    }
+
+    start = time.perf_counter()
+    try:
+        n = run(texts, args.output, config, args.workers, args.restart)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+    print(f"simulate: {n} trials in {elapsed:.1f}s" + (f" ({n / elapsed:,.0f}/s)" if n else ""), file=sys.stderr)
+    for name, s in summarize(texts, args.output, config, args.fpr).items():
+        print(
+            f"simulate: {name}: {s['trials']} trials, detected {s['detected_before']:.1%} -> {s['detected_after']:.1%}"
+            f" (score {s['score_before']:.3f} -> {s['score_after']:.3f}, threshold {s['threshold']:.3f})",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
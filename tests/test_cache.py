@@ -0,0 +1,64 @@
+import itertools
+
+import pytest
+
+from services import cache
+from services.cache import DiskLRU
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # a strictly increasing time.time, so access order never ties
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(ticks)))
+
+
+def open_store(tmp_path, **options) -> DiskLRU:
+    # memory_entries=0: every get goes to disk, and so refreshes the entry's access time there
+    return DiskLRU(str(tmp_path / "store.sqlite3"), memory_entries=0, **options)
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    store = open_store(tmp_path, max_bytes=100)
+    for k in "abcd": store.put(k, "x" * 20)
+    assert store.get("a") == "x" * 20
+    # over budget: down to 90% of it, oldest access first. a was read after b, c, d were written
+    store.put("e", "x" * 40)
+    assert store.stats()["bytes"] == 80
+    assert store.get("b") is None and store.get("c") is None and store.get("d") is not None
+    assert store.get("a") is not None and store.get("e") is not None
+    store.close()
+
+
+def test_oversized_value_stays_in_memory_only(tmp_path, clock):
+    store = DiskLRU(str(tmp_path / "store.sqlite3"), max_bytes=10)
+    store.put("k", "x" * 11)
+    assert store.get("k") == "x" * 11
+    assert store.stats()["entries"] == 0 and store.stats()["bytes"] == 0
+    store.close()
+
+
+def test_size_survives_reopen(tmp_path, clock):
+    store = open_store(tmp_path, max_bytes=100)
+    store.put("a", "x" * 40)
+    store.put("a", "x" * 30)
+    store.close()
+    store = open_store(tmp_path, max_bytes=100)
+    assert store.stats()["bytes"] == 30
+    # counted from disk, so the next put evicts as if nothing was closed
+    store.put("b", "x" * 80)
+    assert store.get("a") is None and store.stats()["bytes"] == 80
+    store.close()
+
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    store = open_store(tmp_path, ttl=60)
+    store.put("a", "1")
+    now[0] += 59
+    assert store.get("a") == "1"
+    now[0] += 2
+    assert store.get("a") is None
+    assert store.stats()["expired"] == 1 and store.stats()["entries"] == 0
+    store.close()
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+from bench.fakes import FakeFirestore
+from services.writer import WriteBehindWriter, updated_field
+
+
+@pytest.fixture
+def journal_dir(tmp_path) -> str:
+    return str(tmp_path / "journal")
+
+
+def open_writer(db, journal_dir: str) -> WriteBehindWriter:
+    return WriteBehindWriter(db, journal_dir=journal_dir, flush_interval=0.01, retry_delay=0.01)
+
+
+def dead_letters(writer: WriteBehindWriter) -> list[dict]:
+    if not os.path.exists(writer.dead_letter_path): return []
+    with open(writer.dead_letter_path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_bad_write_is_dead_lettered_alone(journal_dir):
+    db = FakeFirestore()
+    writer = open_writer(db, journal_dir)
+    for i in range(7): writer.set(f"responses/{i}", {"i": i})
+    # an update of a missing document fails the whole batch, permanently
+    writer.update("responses/missing", {"x": 1})
+    for i in range(7, 10): writer.set(f"responses/{i}", {"i": i})
+    assert writer.flush(5)
+
+    assert sorted(db.docs) == sorted(f"responses/{i}" for i in range(10))
+    assert all(updated_field in d for d in db.docs.values())
+    assert writer.dead == 1
+    [dead] = dead_letters(writer)
+    assert dead["path"] == "responses/missing" and "NotFound" in dead["error"]
+    writer.close()
+    # every write acknowledged: nothing left to replay
+    assert not os.path.exists(writer.journal_path)
+
+
+def test_client_init_failure_is_retried(journal_dir):
+    db = FakeFirestore()
+    attempts = []
+
+    def client():
+        attempts.append(1)
+        if len(attempts) < 3: raise ValueError("no credentials yet")
+        return db
+
+    writer = open_writer(client, journal_dir)
+    writer.set("responses/a", {"x": 1})
+    assert writer.flush(5)
+    assert "responses/a" in db.docs
+    assert writer.failures == 2 and writer.dead == 0 and not dead_letters(writer)
+    writer.close()
+
+
+def test_unacknowledged_writes_are_replayed(journal_dir):
+    class Down(FakeFirestore):
+        def batch(self):
+            raise ConnectionError("unavailable")
+
+    writer = open_writer(Down(), journal_dir)
+    writer.set("responses/a", {"x": 1})
+    writer.close(timeout=0.1)
+
+    db = FakeFirestore()
+    writer = open_writer(db, journal_dir)
+    assert writer.flush(5)
+    assert db.docs["responses/a"]["x"] == 1
+    writer.close()
@@ -1,19 +1,11 @@
-import os
-import sys
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import Misc, TclError
 
-def resource_path(relative_path):
-    if hasattr(sys, "_MEIPASS"):
-        # PyInstaller temp folder
-        base_path = sys._MEIPASS
-    else:
-        # Running from source
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
+from services.resources import data_dir_path, resource_path
+from ui.scheduler import Scheduler
+from ui.ticker import Ticker
 
-data_dir_path = resource_path("data/")
 padding = {'padx': 5, 'pady': 5}
 font = 'Ariel'
 title_font = (font, 22)
@@ -29,21 +21,45 @@ def set_text(w: tk.Text, text: str):
     w.insert("1.0", text)
 
 
-def config_enable(widget: tk.Misc, enabled: bool):
+def _leaves(widget: tk.Misc):
+    # the configurable widgets under widget: frames and canvas windows are walked into
     if isinstance(widget, (tk.Frame, ttk.Frame)):
         for w in widget.winfo_children():
-            config_enable(w, enabled)
+            yield from _leaves(w)
         return
     if isinstance(widget, tk.Canvas):
         for item in widget.find_all():
             if widget.type(item) == "window":
-                child_widget = widget.nametowidget(widget.itemcget(item, "window"))
-                config_enable(child_widget, enabled)
+                yield from _leaves(widget.nametowidget(widget.itemcget(item, "window")))
         return
-    try:
-        widget.config(state="normal" if enabled else "disabled")
-    except TclError:
-        pass
+    yield widget
+
+
+def _set_state(widgets, enabled: bool):
+    for w in widgets:
+        try:
+            w.config(state="normal" if enabled else "disabled")
+        except TclError:
+            pass
+
+
+def config_enable(widget: tk.Misc, enabled: bool):
+    _set_state(_leaves(widget), enabled)
+
+
+# config_enable for a frame that is switched over and over (e.g. on every key press): the widget tree is walked
+# once, and nothing is reconfigured while the state stays the same. for frames whose children don't change
+class EnableSwitch:
+    def __init__(self, widget: tk.Misc):
+        self.widget = widget
+        self.enabled: bool | None = None
+        self._widgets: list[tk.Misc] | None = None
+
+    def set(self, enabled: bool):
+        if enabled == self.enabled: return
+        self.enabled = enabled
+        if self._widgets is None: self._widgets = list(_leaves(self.widget))
+        _set_state(self._widgets, enabled)
 
 
 class App(tk.Tk):
@@ -71,6 +87,11 @@ class App(tk.Tk):
         container.grid_columnconfigure(0, weight=1)
         container.pack(side="top", expand=True, fill="both")
 
+        # all background work (watermarking, login, queries) goes through here
+        self.scheduler = Scheduler(self, workers=4)
+        # one clock for every on-screen timer
+        self.ticker = Ticker(self)
+
         self.__bind_return()
         self.__setup_dimensions()
 
@@ -6,7 +6,8 @@ from typing import Callable, Any
 
 from services.oauth2 import google_login
 from ui.app import WidgetFrame
-from ui.app import data_dir_path
+from services.resources import data_dir_path
+from ui.coalesce import on_resize
 from ui.scrollable_frame import ScrollableFrame
 
 
@@ -35,10 +36,7 @@ class TermsPage(WidgetFrame):
         text_content = ttk.Label(frame.content, text=terms_text, anchor="nw", justify="left")
         text_content.pack(expand=True, fill='x', padx=5, pady=5)
 
-        def on_canvas_resize(event):
-            text_content.configure(wraplength=event.width - 10)
-
-        frame.canvas.bind("<Configure>", on_canvas_resize)
+        on_resize(frame.canvas, lambda w, h: text_content.configure(wraplength=w - 10), width_only=True)
 
         # accept/reject buttons
         b_frame = ttk.Frame(self)
@@ -58,14 +56,30 @@ class AuthPage(WidgetFrame):
         ttk.Button(self, text="Log in with Google", command=lambda: self.login_async()).pack()
         ttk.Button(self, text="Dummy Login", command=lambda: self.on_login("dummy", "test@example.com")).pack()
 
+    _login_pending = False
+
     def login_async(self):
+        # google_login blocks on the browser redirect and can't be cancelled: it gets a thread of its own instead
+        # of a scheduler worker, and clicks while it is pending are ignored
+        if self._login_pending: return
+        self._login_pending = True
+
         def worker():
-            user = google_login()
+            try:
+                user = google_login()
+            except Exception as e:
+                self.app.after(0, lambda: self.login_failed(e))
+                return
             self.app.after(0, lambda: self.login_callback(user))
 
-        threading.Thread(target=worker, daemon=True).start()
+        threading.Thread(target=worker, name="google-login", daemon=True).start()
+
+    def login_failed(self, e: Exception):
+        print(f"login failed: {e}")
+        self._login_pending = False
 
     def login_callback(self, user):
+        self._login_pending = False
         self.app.lift()
         self.app.focus_force()
         self.app.attributes('-topmost', True)
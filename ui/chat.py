@@ -4,7 +4,8 @@ from tkinter.scrolledtext import ScrolledText
 from typing import Optional, Callable
 
 from ui.app import WidgetFrame
-from ui.scrollable_frame import ScrollableFrame
+from ui.coalesce import Coalesced
+from ui.scrollable_frame import VirtualList
 
 
 class ChatPage(WidgetFrame):
@@ -13,16 +14,25 @@ class ChatPage(WidgetFrame):
     _font_size = 9
 
     _response_cell: Optional[str] = None
-    response_label: Optional[ttk.Label] = None
+    # index of the response being written in the chat history
+    _response_index: Optional[int] = None
+    _streamed: list[str]
 
     def _create_widgets(self):
-        self.chat_history_frame = ScrollableFrame(self, scroll_y=True)
-        self.chat_history_frame.pack(fill="both", expand=True)
+        # only the visible messages have widgets, however long the chat gets
+        self.chat_history = VirtualList(self, wraplength=500)
+        self.chat_history.pack(fill="both", expand=True)
+        self._user_font = font.Font(size=self._font_size, slant="italic")
+        self._response_font = font.Font(size=self._font_size)
 
         self._text_form = ScrolledText(self, height=1, wrap="word")
         self.app.set_on_submit(self._text_form, lambda: self.submit())
         self._text_form.pack()
 
+        # chunks arriving within one idle cycle make for a single update of the response
+        self._streamed = []
+        self._show_streamed = Coalesced(self, self._update_streamed)
+
         self._submit_button = ttk.Button(self, text="Chat", command=lambda: self.submit())
         self._submit_button.pack()
         self.app.set_on_submit(self._submit_button, lambda: self.submit())
@@ -38,36 +48,32 @@ class ChatPage(WidgetFrame):
         self._text_form.config(state="disabled")
         self._submit_button.config(state="disabled")
 
-        _user_font = font.Font(size=self._font_size, slant="italic")
-        _response_font = font.Font(size=self._font_size)
-
-        # add query label to chat history
-        q_label = ttk.Label(
-            self.chat_history_frame.content,
-            text=q, font=_user_font,
-            wraplength=500
-        )
-        q_label.pack(anchor="e")
-        # add response label to chat history
-        self.response_label = ttk.Label(
-            self.chat_history_frame.content,
-            text="Thinking...", font=_response_font,
-            wraplength=500
-        )
-        self.response_label.pack(anchor="w")
+        # add query and response to chat history
+        self.chat_history.append(q, font=self._user_font, anchor="e")
+        self._response_index = self.chat_history.append("Thinking...", font=self._response_font, anchor="w")
+        self._streamed = []
         # scroll to chat bottom
-        self.chat_history_frame.update_idletasks()
-        self.chat_history_frame.canvas.yview_moveto(1.0)
+        self.chat_history.see_end()
 
         # fire listener
         if self.on_submit: self.on_submit(q)
 
+    def response_chunk(self, chunk: str):
+        self._streamed.append(chunk)
+        self._show_streamed()
+
+    def _update_streamed(self):
+        self.chat_history.set(self._response_index, "".join(self._streamed))
+        # keep following the chat bottom
+        self.chat_history.see_end()
+
     def response(self, response: str, ok: bool = True):
+        # the full text replaces whatever of the stream is still pending
+        self._show_streamed.cancel()
         # update response
-        self.response_label.config(text=response)
+        self.chat_history.set(self._response_index, response)
         # scroll to chat bottom
-        self.chat_history_frame.update_idletasks()
-        self.chat_history_frame.canvas.yview_moveto(1.0)
+        self.chat_history.see_end()
 
         # re-enable query form
         self._text_form.config(state="normal")
@@ -0,0 +1,65 @@
+import tkinter as tk
+from typing import Callable
+
+
+# collapses a burst of calls (key presses, variable traces, <Configure> events) into a single deferred call,
+# made once tk is idle (or after delay_ms), with the arguments of the last call of the burst
+class Coalesced:
+    def __init__(self, widget: tk.Misc, fn: Callable, delay_ms: int = 0):
+        self.widget = widget
+        self.fn = fn
+        self.delay_ms = delay_ms
+        self._args = ()
+        self._pending: str | None = None
+        self.calls = 0
+        self.runs = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        self._args = args
+        if self._pending is not None: return
+        if self.delay_ms: self._pending = self.widget.after(self.delay_ms, self._run)
+        else: self._pending = self.widget.after_idle(self._run)
+
+    def _run(self):
+        self._pending = None
+        self.runs += 1
+        self.fn(*self._args)
+
+    def flush(self):
+        # run now if a call is pending
+        if self._pending is None: return
+        self.widget.after_cancel(self._pending)
+        self._run()
+
+    def cancel(self):
+        if self._pending is None: return
+        self.widget.after_cancel(self._pending)
+        self._pending = None
+
+
+def on_resize(widget: tk.Misc, fn: Callable[[int, int], None], width_only: bool = False) -> Coalesced:
+    # fn(width, height) at most once per idle cycle, and only when the size (or just the width) really changed.
+    # added to the widget's existing <Configure> bindings
+    last = [None]
+
+    def apply(event):
+        size = (event.width, event.height)
+        key = size[0] if width_only else size
+        if key == last[0]: return
+        last[0] = key
+        fn(*size)
+
+    coalesced = Coalesced(widget, apply)
+    widget.bind("<Configure>", coalesced, add="+")
+    return coalesced
+
+
+def on_text_modified(text: tk.Text, fn: Callable[[], None]):
+    # fn on actual edits of a Text (typing, paste, undo), not on every key event (arrows, modifiers, repeats)
+    def modified(event):
+        if not text.edit_modified(): return  # resetting the flag below fires <<Modified>> too
+        text.edit_modified(False)
+        fn()
+
+    text.bind("<<Modified>>", modified, add="+")
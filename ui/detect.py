@@ -1,5 +1,4 @@
 import random
-import threading
 import tkinter
 from tkinter import END, font
 from tkinter import ttk
@@ -7,9 +6,15 @@ from tkinter.font import Font
 from tkinter.scrolledtext import ScrolledText
 from typing import Optional, Callable
 
-from ui.app import App, WidgetFrame, config_enable, set_text
-from ui.scrollable_frame import ScrollableFrame
+from services import telemetry
+from services.llm import wrap_query
+from services.survey import min_response_chars, min_word_count
+from services.tracing import Trace, tracer, untraced
+from services.watermark import streamable
+from ui.app import App, WidgetFrame, EnableSwitch, config_enable
+from ui.coalesce import Coalesced, on_text_modified
 from ui.survey import TimerFrame, ResponseContainer
+from ui.text_view import TextView
 
 
 class DetectPage(WidgetFrame, ResponseContainer):
@@ -17,26 +22,47 @@ class DetectPage(WidgetFrame, ResponseContainer):
 
     _font_size = 12
     _font_size_title = 16
-    _min_word_count = 100
-    _min_response_char_count = 30
+    _min_word_count = min_word_count
+    _min_response_char_count = min_response_chars
 
     _response_cell: Optional[str] = None
 
+    # last validity reported by <<PageValidityChanged>>
+    _valid: Optional[bool] = None
+    # the response text as shown (the view may have been edited since)
+    _response_text: str = ""
+
+    # mark applied to streamed chunks (None if the mark needs the full text), and the chunk count so far
+    _stream_mark: Optional[Callable[[str], str]] = None
+    _stream_chunks: int = 0
+
+    # trace of the current query; every query of the page ends up in get_data()["timings"]
+    trace: Trace = untraced
+
     def __init__(
             self, app: App, master: tkinter.Misc | None = None,
             title: str = None,
             watermark: Callable[[str], str] | None = None, mark_prob: float = 1.0,
-            questions=None
+            questions=None,
+            marked: bool | None = None, question: str | None = None
     ):
         # title
         self.title = title
+        self._traces: list[Trace] = []
+        # keystrokes, focus, scrolls and choices on this page, saved with it
+        self.telemetry = telemetry.EventRecorder()
 
-        # random mark
-        self.mark = random.choices([watermark, None], weights=[mark_prob, 1 - mark_prob])[0]
+        # mark: given outcome (e.g. from the assignment engine), or random by mark_prob
+        if marked is not None:
+            self.mark = watermark if marked else None
+        else:
+            self.mark = random.choices([watermark, None], weights=[mark_prob, 1 - mark_prob])[0]
 
-        # random question
+        # question: given, or random
         self.question_text = ''
-        if questions is None:
+        if question is not None:
+            self.question_text = question.strip().capitalize()
+        elif questions is None:
             self.question_text = "< QUESTION >"
         else:
             self.question_text = random.choice(questions).strip().capitalize()
@@ -105,18 +131,9 @@ class DetectPage(WidgetFrame, ResponseContainer):
         self.q_var: tkinter.StringVar = tkinter.StringVar()
         ttk.Label(model_frame, textvariable=self.q_var, font=_user_font).pack()
         ttk.Label(model_frame, text="Response:").pack()
-        # model response frame
-        self.scroll = ScrollableFrame(model_frame, scroll_y=True, scroll_x=True)
-        self.scroll.pack(fill="both", expand=True)
-        self.text_var = tkinter.StringVar()
-        # text form (editable)
-        self.tt = tkinter.Text(self.scroll.content, wrap="word")
-        self.text_var.trace_add("write", lambda var, index, mode: set_text(self.tt, self.text_var.get()))
-        self.tt.grid(row=0, column=0, sticky="nsew")
-        # text label (non-editable)
-        self.tl = tkinter.Label(self.scroll.content, textvariable=self.text_var, anchor="nw", justify="left")
-        self.tl.grid(row=0, column=0, sticky="nsew")
-        self.tl.bind("<Configure>", lambda event: self.tl.configure(wraplength=event.width - 50))
+        # model response: one text widget, read-only until the participant may edit it
+        self.view = TextView(model_frame)
+        self.view.pack(fill="both", expand=True)
         # query submission
         self.submit_frame = ttk.Frame(model_frame)
         self.submit_frame.pack(fill="x", expand=True)
@@ -145,20 +162,23 @@ class DetectPage(WidgetFrame, ResponseContainer):
         self.is_wm_yes_var = tkinter.BooleanVar()
         self.is_wm_no_var = tkinter.BooleanVar()
         radio_frame = ttk.Frame(self.user_response_frame)
+
+        def choose(chosen: tkinter.BooleanVar, other: tkinter.BooleanVar, target: int):
+            self.telemetry.record(telemetry.code(telemetry.TOGGLE, target))
+            other.set(not chosen.get())
+
         self.b_wm_yes = ttk.Radiobutton(
             radio_frame, text="Yes",
             variable=self.is_wm_yes_var,
-            command=lambda: self.is_wm_no_var.set(not self.is_wm_yes_var.get())
+            command=lambda: choose(self.is_wm_yes_var, self.is_wm_no_var, telemetry.WM_YES)
         )
         self.b_wm_no = ttk.Radiobutton(
             radio_frame, text="No",
             variable=self.is_wm_no_var,
-            command=lambda: self.is_wm_yes_var.set(not self.is_wm_no_var.get())
+            command=lambda: choose(self.is_wm_no_var, self.is_wm_yes_var, telemetry.WM_NO)
         )
         self.b_wm_yes.grid(row=0, column=0)
         self.b_wm_no.grid(row=0, column=1)
-        self.is_wm_yes_var.trace_add("write", lambda v, i, m: self.validity_changed())
-        self.is_wm_no_var.trace_add("write", lambda v, i, m: self.validity_changed())
         radio_frame.grid(row=2, column=0)
         # reasoning
         reasoning_frame = ttk.Frame(self.user_response_frame)
@@ -217,29 +237,50 @@ class DetectPage(WidgetFrame, ResponseContainer):
         # results
         ttk.Label(answer_frame, textvariable=self._response_correctness_var).grid(row=0, column=1)
 
+        # disjoint frames: a switch caches its leaves, so nested switches would undo each other
+        reasoning_switch = EnableSwitch(reasoning_detect_frame)
+        reasoning_change_switch = EnableSwitch(reasoning_change_frame)
+
+        def set_len(var: tkinter.IntVar, entry: tkinter.Text):
+            n = len(entry.get("1.0", END).strip())
+            if n != var.get(): var.set(n)
+
         def update_user_response():
             is_w: bool = self.is_wm_yes_var.get()
 
-            self.len_rd_var.set(len(self.reasoning_detect_entry.get("1.0", END).strip()))
-            self.len_rc_var.set(len(self.reasoning_change_entry.get("1.0", END).strip()))
+            set_len(self.len_rd_var, self.reasoning_detect_entry)
+            set_len(self.len_rc_var, self.reasoning_change_entry)
 
             is_rd_over_min = self.len_rd_var.get() >= self._min_response_char_count
-            is_rc_over_min = self.len_rc_var.get() >= self._min_response_char_count
 
-            config_enable(reasoning_frame, is_w)
-            config_enable(reasoning_change_frame, is_w and is_rd_over_min)
+            # only widgets whose state actually changes are touched
+            reasoning_switch.set(is_w)
+            reasoning_change_switch.set(is_w and is_rd_over_min)
             self.set_text_editable(is_w and is_rd_over_min)
 
             self.validity_changed()
 
-        self.is_wm_yes_var.trace_add(
-            "write",
-            lambda var, index, mode: update_user_response()
-        )
-        self.reasoning_detect_entry.bind("<Any-KeyPress>", lambda e: update_user_response(), add="+")
-        self.reasoning_change_entry.bind("<Any-KeyPress>", lambda e: update_user_response(), add="+")
-        self.reasoning_detect_entry.bind("<Any-KeyRelease>", lambda e: update_user_response(), add="+")
-        self.reasoning_change_entry.bind("<Any-KeyRelease>", lambda e: update_user_response(), add="+")
+        # key presses, edits and radio changes within one idle cycle make for a single update
+        self._update_user_response = Coalesced(self, update_user_response)
+        self.is_wm_yes_var.trace_add("write", lambda var, index, mode: self._update_user_response())
+        self.is_wm_no_var.trace_add("write", lambda var, index, mode: self._update_user_response())
+        on_text_modified(self.reasoning_detect_entry, self._update_user_response)
+        on_text_modified(self.reasoning_change_entry, self._update_user_response)
+
+        # interaction telemetry
+        telemetry.watch(self.telemetry, self._query_form, telemetry.QUERY)
+        telemetry.watch(self.telemetry, self.view.text, telemetry.RESPONSE_TEXT, scroll=True)
+        telemetry.watch(self.telemetry, self.reasoning_detect_entry, telemetry.REASONING)
+        telemetry.watch(self.telemetry, self.reasoning_change_entry, telemetry.ACTION)
+
+        def record(kind: int, target: int = telemetry.PAGE):
+            c = telemetry.code(kind, target)
+            return lambda e: self.telemetry.record(c)
+
+        self.view.scroll_y.bind("<ButtonPress-1>", record(telemetry.SCROLL, telemetry.RESPONSE_TEXT), add="+")
+        # the notebook unmaps pages while another tab is selected
+        self.bind("<Map>", record(telemetry.SHOWN), add="+")
+        self.bind("<Unmap>", record(telemetry.HIDDEN), add="+")
 
         self.user_response_frame.pack(fill="x", expand=True)
 
@@ -265,21 +306,21 @@ class DetectPage(WidgetFrame, ResponseContainer):
         # disable query form
         config_enable(self.submit_frame, False)
 
+        # streamed chunks are watermarked as they arrive, the participant never sees unmarked text
+        self._stream_mark = streamable(self.mark)
+        self._stream_chunks = 0
+
+        self.telemetry.record(telemetry.code(telemetry.SUBMIT, telemetry.QUERY))
+
+        # query -> llm -> watermark -> render
+        self.trace = tracer.trace("query", page=self.title)
+        self._traces.append(self.trace)
+
         # fire listener
-        wrapped_q = (
-                q + "\n" +
-                f"Your answer must be at least {self._min_word_count} words long." +
-                "Your answer must be entirely plaintext and contain NO highlights or formatting (no bold, italic or any markdown)."
-        )
-        if self.on_submit: self.on_submit(wrapped_q)
+        if self.on_submit: self.on_submit(wrap_query(q, self._min_word_count))
 
     def set_text_editable(self, enabled: bool = True):
-        if enabled:
-            self.tl.lower()
-            self.tt.lift()
-        else:
-            self.tl.lift()
-            self.tt.lower()
+        self.view.set_editable(enabled)
 
     def set_response_text(self, text: str | None, user_response_enabled: bool = False):
         # update user instructions
@@ -290,12 +331,9 @@ class DetectPage(WidgetFrame, ResponseContainer):
             self.question_frame.pack()
             self.user_response_frame.pack_forget()
 
-        # set text
-        self.text_var.set(text)
-
-        # scroll to frame top bottom
-        self.scroll.update_idletasks()
-        self.scroll.canvas.yview_moveto(0.0)
+        # set text (scrolled to the top)
+        self._response_text = text or ""
+        self.view.set(self._response_text)
 
         # re-enable query form
         if user_response_enabled:
@@ -306,26 +344,62 @@ class DetectPage(WidgetFrame, ResponseContainer):
         # clear query form
         self._query_form.delete('1.0', END)
 
+    def response_chunk(self, chunk: str):
+        self._stream_chunks += 1
+        if self._stream_mark is None:
+            # mark needs the whole text, only show progress
+            self.view.set(f"Generating Response... ({self._stream_chunks})")
+            return
+        wmc = self._stream_mark(chunk)
+        # appended, not rewritten: O(chunk) per chunk
+        if self._stream_chunks == 1: self.view.set(wmc)
+        else: self.view.append(wmc)
+
     def response(self, response: str | None, ok: bool = True):
+        trace = self.trace
         # update model response text
         if response is None or not ok:
+            trace.end(error=response)
             self.app.after(0, lambda: self.set_response_text(response))
             return
 
-        def watermark_worker():
-            wm = self.mark
-            wmr = wm(response) if wm is not None else response
+        # from the llm call finishing on its loop to this callback on the tk thread
+        trace.span("deliver", start=trace.last_end).end()
+        watermark_span = trace.span("watermark")
 
+        def watermark_worker():
+            with watermark_span:
+                watermark_span.set(watermark_queue_ms=round(watermark_span.ms, 1))
+                # the frozen stream mark, so the final text matches what was shown while streaming
+                wm = self._stream_mark if self._stream_mark is not None else self.mark
+                return wm(response) if wm is not None else response
+
+        def show(wmr: str):
+            render = trace.span("render", start=trace.last_end)
             self.is_wm_yes_var.set(False)
             self.is_wm_no_var.set(False)
             self._response_correctness_var.set("")
+            self.set_response_text(wmr, user_response_enabled=True)
+            self.telemetry.record(telemetry.code(telemetry.RESPONSE, telemetry.RESPONSE_TEXT))
 
-            # update UI safely from main thread
-            self.app.after(0, lambda: self.set_response_text(wmr, user_response_enabled=True))
+            def rendered():
+                render.end()
+                trace.end()
 
-        self.set_response_text("Watermarking...")
+            # once tk is idle again, i.e. the new text has been laid out
+            self.app.after_idle(rendered)
 
-        threading.Thread(target=watermark_worker, daemon=True).start()
+        def failed(e: Exception):
+            trace.end(error=repr(e))
+            self.set_response_text(f"Error: {e}")
+
+        if self._stream_mark is None or not self._stream_chunks:
+            self.set_response_text("Watermarking...")
+
+        # a newer response for this page supersedes a watermark job still in flight
+        self.app.scheduler.submit(
+            watermark_worker, key=(id(self), "watermark"), on_done=show, on_error=failed
+        )
 
     def confirm_choices(self):
         # lock in choices
@@ -355,19 +429,26 @@ class DetectPage(WidgetFrame, ResponseContainer):
         return True
 
     def validity_changed(self):
+        # the pager only hears about actual changes
+        valid = self.is_valid()
+        if valid == self._valid: return
+        self._valid = valid
         self.event_generate("<<PageValidityChanged>>")
 
     def get_data(self) -> dict:
         return {
-            "t": self.timer.dtime().seconds,
+            # seconds, to the ms. total_seconds: timedelta.seconds wraps at a day
+            "t": round(self.timer.dtime().total_seconds(), 3),
+            "timings": [t.timings() for t in self._traces],
+            "telemetry": self.telemetry.pack(),
             "question": self.question_text,
             "user_query": self.q_var.get(),
-            "model_response": self.text_var.get(),
+            "model_response": self._response_text,
             "user_survey":
                 {
                     "is_wm": True,
                     "reasoning": self.reasoning_detect_entry.get("1.0", END).strip(),
-                    "text_edited": self.tt.get("1.0", END).strip(),
+                    "text_edited": self.view.get().strip(),
                     "edited_action": self.reasoning_change_entry.get("1.0", END).strip()
                 }
                 if self.is_wm_yes_var.get()
@@ -0,0 +1,158 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Any, Hashable
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class CancelToken:
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self.future: Future | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None: self.future.cancel()
+
+
+class _Task:
+    def __init__(self, fn: Callable[[], Any], token: CancelToken, key: Hashable | None, on_done, on_error):
+        self.fn = fn
+        self.token = token
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.submitted = time.monotonic()
+
+
+# fixed pool of worker threads running background jobs by priority (lower first, fifo within a priority).
+# jobs submitted under a key supersede the previous job with that key: it is dropped if still queued,
+# and its result is never delivered. results are delivered on the tk thread through app.after.
+class Scheduler:
+    slow_wait = 1.0  # seconds in queue after which a job is reported as starved
+
+    def __init__(self, app=None, workers: int = 4):
+        self.app = app
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._keys: dict[Hashable, CancelToken] = {}
+        self._lock = threading.Lock()
+
+        self.running = 0
+        self.completed = 0
+        self.dropped = 0
+        self.max_wait = 0.0
+        self._total_wait = 0.0
+        self._started = 0
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"scheduler-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for w in self._workers: w.start()
+
+    def _supersede(self, key: Hashable | None, token: CancelToken):
+        if key is None: return
+        with self._lock:
+            old = self._keys.get(key)
+            self._keys[key] = token
+        if old is not None: old.cancel()
+
+    def _release(self, key: Hashable | None, token: CancelToken):
+        # a finished job's key, unless a newer job holds it by now
+        if key is None: return
+        with self._lock:
+            if self._keys.get(key) is token: del self._keys[key]
+
+    def _deliver(self, token: CancelToken, key: Hashable | None, callback, value):
+        # the key is released only once the result is delivered: until then a newer job can still supersede it
+        if callback is None:
+            self._release(key, token)
+            return
+
+        def run():
+            try:
+                if not token.cancelled: callback(value)
+            finally:
+                self._release(key, token)
+
+        if self.app is None: run()
+        else: self.app.after(0, run)
+
+    def submit(
+            self, fn: Callable[[], Any],
+            priority: int = PRIORITY_NORMAL, key: Hashable | None = None,
+            on_done: Callable[[Any], None] | None = None,
+            on_error: Callable[[Exception], None] | None = None,
+    ) -> CancelToken:
+        token = CancelToken()
+        self._supersede(key, token)
+        self._queue.put((priority, next(self._seq), _Task(fn, token, key, on_done, on_error)))
+        return token
+
+    def attach(
+            self, future: Future, key: Hashable | None = None,
+            on_done: Callable[[Any], None] | None = None,
+            on_error: Callable[[Exception], None] | None = None,
+    ) -> CancelToken:
+        # track work running elsewhere (e.g. on the llm loop) under the same supersede/cancel rules
+        token = CancelToken()
+        token.future = future
+        self._supersede(key, token)
+
+        def done(f: Future):
+            if f.cancelled():
+                self._release(key, token)
+                return
+            e = f.exception()
+            if e is None: self._deliver(token, key, on_done, f.result())
+            else: self._deliver(token, key, on_error, e)
+
+        future.add_done_callback(done)
+        return token
+
+    def _work(self):
+        while True:
+            _, _, task = self._queue.get()
+            wait = time.monotonic() - task.submitted
+            if task.token.cancelled:
+                with self._lock: self.dropped += 1
+                self._release(task.key, task.token)
+                continue
+            with self._lock:
+                self.running += 1
+                self._started += 1
+                self._total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            if wait > self.slow_wait:
+                print(f"scheduler: job waited {wait:.2f}s in queue (depth {self._queue.qsize()})")
+            try:
+                r = task.fn()
+                self._deliver(task.token, task.key, task.on_done, r)
+            except Exception as e:
+                if task.on_error is None: print(f"scheduler: job failed: {e}")
+                self._deliver(task.token, task.key, task.on_error, e)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "running": self.running,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "avg_wait": self._total_wait / self._started if self._started else 0.0,
+                "max_wait": self.max_wait,
+            }
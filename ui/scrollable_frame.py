@@ -1,7 +1,30 @@
 import tkinter as tk
 from tkinter import ttk
 
-class ScrollableFrame(ttk.Frame):
+from ui.coalesce import Coalesced, on_resize
+
+
+# expects self.canvas, self.scroll_x and self.scroll_y
+class MouseWheelScroll:
+    # mousewheel handling
+    def _bind_mousewheel(self, event):
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind_all("<Shift-MouseWheel>", self._on_shift_mousewheel)
+
+    def _unbind_mousewheel(self, event):
+        self.canvas.unbind_all("<MouseWheel>")
+        self.canvas.unbind_all("<Shift-MouseWheel>")
+
+    def _on_mousewheel(self, event):
+        if self.scroll_y:
+            self.canvas.yview_scroll(int(-event.delta / 120), "units")
+
+    def _on_shift_mousewheel(self, event):
+        if self.scroll_x:
+            self.canvas.xview_scroll(int(-event.delta / 120), "units")
+
+
+class ScrollableFrame(MouseWheelScroll, ttk.Frame):
     def __init__(self, parent, *, scroll_y=True, scroll_x=False, **kwargs):
         super().__init__(parent, **kwargs)
 
@@ -31,35 +54,165 @@ class ScrollableFrame(ttk.Frame):
         self.grid_columnconfigure(0, weight=1)
 
         # --- Events ---
-        # Update scrollregion when content changes
-        self.content.bind("<Configure>", lambda e: self.canvas.configure(
-            scrollregion=self.canvas.bbox("all")
-        ))
+        # Update scrollregion when content changes (once per idle cycle, however many resizes came in)
+        on_resize(self.content, lambda w, h: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
 
         # Match width if no horizontal scroll
         if not scroll_x:
-            self.canvas.bind(
-                "<Configure>",
-                lambda e: self.canvas.itemconfig(self.window_id, width=e.width)
-            )
+            on_resize(self.canvas, lambda w, h: self.canvas.itemconfig(self.window_id, width=w), width_only=True)
 
         # Mousewheel scroll
         self.canvas.bind("<Enter>", self._bind_mousewheel)
         self.canvas.bind("<Leave>", self._unbind_mousewheel)
 
-    # mousewheel handling
-    def _bind_mousewheel(self, event):
-        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
-        self.canvas.bind_all("<Shift-MouseWheel>", self._on_shift_mousewheel)
 
-    def _unbind_mousewheel(self, event):
-        self.canvas.unbind_all("<MouseWheel>")
-        self.canvas.unbind_all("<Shift-MouseWheel>")
+# item heights as a fenwick tree: an item's top (the sum of the heights before it), a change of one height, and
+# the items above a given y each take O(log n), wherever in the list the change is
+class _Offsets:
+    def __init__(self):
+        self.heights: list[int] = []
+        self._tree = [0]  # 1-based
 
-    def _on_mousewheel(self, event):
-        if self.scroll_y:
-            self.canvas.yview_scroll(int(-event.delta / 120), "units")
+    def __len__(self) -> int:
+        return len(self.heights)
 
-    def _on_shift_mousewheel(self, event):
-        if self.scroll_x:
-            self.canvas.xview_scroll(int(-event.delta / 120), "units")
+    def top(self, i: int) -> int:
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def total(self) -> int:
+        return self.top(len(self.heights))
+
+    def append(self, height: int):
+        i = len(self._tree)
+        self._tree.append(height + self.top(i - 1) - self.top(i - (i & -i)))
+        self.heights.append(height)
+
+    def set(self, i: int, height: int):
+        delta = height - self.heights[i]
+        self.heights[i] = height
+        i += 1
+        while delta and i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def count_above(self, y: float) -> int:
+        # how many items start at or above y (bisect_right over the tops)
+        if y < 0 or not self.heights: return 0
+        pos, step = 0, 1 << (len(self.heights).bit_length() - 1)
+        while step:
+            if pos + step <= len(self.heights) and self._tree[pos + step] <= y:
+                pos += step
+                y -= self._tree[pos]
+            step >>= 1
+        return min(pos, len(self.heights) - 1) + 1
+
+
+# a scrollable list of text items where only the visible items have widgets. the items live in plain lists;
+# a small pool of labels is recycled while scrolling, so the widget count stays constant however long the list.
+# item heights are measured once (on a scratch label) when an item is added or its text changes
+class VirtualList(MouseWheelScroll, ttk.Frame):
+    def __init__(self, parent, *, wraplength: int = 500, pady: int = 2, overscan: int = 2, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.wraplength = wraplength
+        self.pady = pady
+        self.overscan = overscan
+
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scroll_x = None
+        self.scroll_y = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.scroll_y.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # items: text, style (label options + "anchor": "w" | "e"), height (and from it top y)
+        self.texts: list[str] = []
+        self.styles: list[dict] = []
+        self._offsets = _Offsets()
+        self._versions: list[int] = []
+
+        # visible item index -> (label, canvas window, version shown), and the free labels
+        self._shown: dict[int, tuple[ttk.Label, int, int]] = {}
+        self._pool: list[tuple[ttk.Label, int]] = []
+        self._scratch = ttk.Label(self)
+
+        self._render = Coalesced(self, self._render_now)
+        self.canvas.configure(yscrollcommand=self._on_view)
+        on_resize(self.canvas, lambda w, h: self._relayout())
+
+        self.canvas.bind("<Enter>", self._bind_mousewheel)
+        self.canvas.bind("<Leave>", self._unbind_mousewheel)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _measure(self, text: str, style: dict) -> int:
+        options = {k: v for k, v in style.items() if k != "anchor"}
+        self._scratch.configure(text=text, wraplength=self.wraplength, **options)
+        return self._scratch.winfo_reqheight() + 2 * self.pady
+
+    def append(self, text: str, **style) -> int:
+        i = len(self.texts)
+        self.texts.append(text)
+        self.styles.append(style)
+        self._offsets.append(self._measure(text, style))
+        self._versions.append(0)
+        self._relayout()
+        return i
+
+    def set(self, i: int, text: str):
+        self.texts[i] = text
+        self._versions[i] += 1
+        self._offsets.set(i, self._measure(text, self.styles[i]))
+        self._relayout()
+
+    def see_end(self):
+        self.canvas.update_idletasks()
+        self.canvas.yview_moveto(1.0)
+        self._render.flush()
+
+    def _relayout(self):
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), self._offsets.total()))
+        self._render()
+
+    def _on_view(self, first, last):
+        self.scroll_y.set(first, last)
+        self._render()
+
+    def _render_now(self):
+        if not self.texts: return
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, self._offsets.count_above(top) - 1 - self.overscan)
+        last = min(len(self.texts), self._offsets.count_above(bottom) + self.overscan)
+
+        # give back the labels of items that scrolled out of view
+        for i in [i for i in self._shown if not first <= i < last]:
+            label, window, _ = self._shown.pop(i)
+            self.canvas.itemconfigure(window, state="hidden")
+            self._pool.append((label, window))
+
+        width = self.canvas.winfo_width()
+        for i in range(first, last):
+            shown = self._shown.get(i)
+            if shown is None:
+                label, window = self._pool.pop() if self._pool else self._new_slot()
+                version = -1
+            else:
+                label, window, version = shown
+            style = self.styles[i]
+            if version != self._versions[i]:
+                options = {k: v for k, v in style.items() if k != "anchor"}
+                label.configure(text=self.texts[i], wraplength=self.wraplength, **options)
+            right = style.get("anchor") == "e"
+            self.canvas.coords(window, width if right else 0, self._offsets.top(i) + self.pady)
+            self.canvas.itemconfigure(window, anchor="ne" if right else "nw", state="normal")
+            self._shown[i] = (label, window, self._versions[i])
+
+    def _new_slot(self) -> tuple[ttk.Label, int]:
+        label = ttk.Label(self.canvas)
+        return label, self.canvas.create_window(0, 0, window=label, anchor="nw")
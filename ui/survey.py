@@ -1,82 +1,69 @@
+import time
 import tkinter as tk
-import uuid
-from datetime import datetime, timedelta
+from datetime import timedelta
 from tkinter import ttk, Misc
 from typing import Callable
 
 from ui.app import WidgetFrame, App
+from ui.ticker import Ticker
 
 
 class TimerFrame(tk.Frame):
-    def __init__(self, master):
+    # shows the time since start(); ticks with the app's shared Ticker, and only while visible
+    def __init__(self, master, ticker: Ticker | None = None):
         super().__init__(master)
 
+        self.ticker = ticker
         self.start_time = None
         self.running = False
+        self.visible = False
 
         self.label = tk.Label(self)
         self.label.pack()
 
+        # pages in a notebook are unmapped while another tab is selected
+        self.bind("<Map>", lambda e: self._set_visible(True), add="+")
+        self.bind("<Unmap>", lambda e: self._set_visible(False), add="+")
+
+    def _ticker(self) -> Ticker:
+        if self.ticker is None:
+            top = self.winfo_toplevel()
+            self.ticker = getattr(top, "ticker", None) or Ticker(top)
+        return self.ticker
+
     def start(self):
-        self.start_time = datetime.now()
+        self.start_time = time.monotonic()
         self.running = True
-        self.update_timer()
+        self._update()
 
     def stop(self):
         self.running = False
+        self._update()
 
     def dtime(self) -> timedelta:
-        return datetime.now() - self.start_time
+        return timedelta(seconds=time.monotonic() - self.start_time)
 
-    def update_timer(self):
-        if not self.running:
-            return
+    def _set_visible(self, visible: bool):
+        self.visible = visible
+        self._update()
 
-        delta: timedelta = self.dtime()
-        seconds = int(delta.total_seconds())
+    def _update(self):
+        if self.running and self.visible: self._ticker().subscribe(self.update_timer, self.start_time)
+        elif self.ticker is not None: self.ticker.unsubscribe(self.update_timer)
 
+    def update_timer(self, seconds: int):
         hh = seconds // 3600
         mm = (seconds % 3600) // 60
         ss = seconds % 60
 
         self.label.config(text=f"{hh:02d}:{mm:02d}:{ss:02d}")
 
-        # Schedule next update
-        self.after(100, self.update_timer)
-
 
 class ResponseContainer:
     def get_data(self) -> dict:
         pass
 
 
-class SurveySession:
-    def __init__(self, db, user_id: str):
-        self.db = db
-        self.session_id = str(uuid.uuid4())
-        self.user_id = user_id
-
-        self.ref = (
-            db.collection("responses")
-            .document(self.session_id)
-        )
-
-        self.ref.set({
-            "user_id": user_id,
-        })
-
-    def save_demographics(self, data: dict):
-        self.ref.update({
-            "demographics": data,
-        })
-
-    def save_question(self, page_index: int, data: dict):
-        self.ref.collection("pages").document(str(page_index)).set({
-            **data,
-            "page_index": page_index
-        })
-
-
 class PagedFrame(WidgetFrame):
     _pages: list[WidgetFrame] = []
     _current_index: int | None = None
@@ -0,0 +1,75 @@
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+
+# a scrollable text view over a single Text widget, read-only or editable. the text lives only in the widget;
+# long texts are inserted in chunks over several event loop turns, so showing them doesn't freeze the window
+class TextView(ttk.Frame):
+    chunk_chars = 16384
+
+    def __init__(self, master, editable: bool = False, **text_options):
+        super().__init__(master)
+        self.text = tk.Text(self, wrap="word", **text_options)
+        self.scroll_y = ttk.Scrollbar(self, orient="vertical", command=self.text.yview)
+        self.text.configure(yscrollcommand=self.scroll_y.set)
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.scroll_y.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # text still to be inserted (from _offset on in the first one), and the pending insert job
+        self._queue: deque[str] = deque()
+        self._offset = 0
+        self._loading: str | None = None
+
+        self.editable: bool | None = None
+        self.set_editable(editable)
+
+    def set_editable(self, editable: bool):
+        if editable == self.editable: return
+        self.editable = editable
+        self.text.configure(state="normal" if editable else "disabled")
+
+    def _edit(self, fn, *args):
+        # programmatic changes need the widget enabled, even while it is read-only to the user
+        if not self.editable: self.text.configure(state="normal")
+        fn(*args)
+        if not self.editable: self.text.configure(state="disabled")
+
+    def set(self, text: str):
+        self._cancel()
+        self._edit(self.text.delete, "1.0", "end")
+        self.append(text)
+        self.text.yview_moveto(0.0)
+
+    def append(self, text: str):
+        if not text: return
+        if self._loading is None and len(text) <= self.chunk_chars:
+            self._edit(self.text.insert, "end", text)
+            return
+        self._queue.append(text)
+        if self._loading is None: self._load()
+
+    def _load(self):
+        self._loading = None
+        # sliced at an offset rather than cutting the queued text down: that copies the rest on every chunk
+        text, start = self._queue[0], self._offset
+        head = text[start:start + self.chunk_chars]
+        self._offset = start + len(head)
+        if self._offset >= len(text):
+            self._queue.popleft()
+            self._offset = 0
+        self._edit(self.text.insert, "end", head)
+        # after(1) rather than after_idle, so input and redraws get in between chunks
+        if self._queue: self._loading = self.after(1, self._load)
+
+    def _cancel(self):
+        if self._loading is not None: self.after_cancel(self._loading)
+        self._loading = None
+        self._queue.clear()
+        self._offset = 0
+
+    def get(self) -> str:
+        queued = "".join(self._queue)[self._offset:] if self._queue else ""
+        return self.text.get("1.0", "end-1c") + queued
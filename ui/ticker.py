@@ -0,0 +1,53 @@
+import math
+import time
+import tkinter as tk
+from typing import Callable
+
+Tick = Callable[[int], None]
+
+
+# one clock for every timer of the app (App.ticker): a single pending after() for all subscribers, woken only
+# when some subscriber's elapsed time crosses a whole second. time.monotonic, so wall clock changes don't matter.
+class Ticker:
+    def __init__(self, widget: tk.Misc):
+        self.widget = widget
+        # tick -> (origin, last whole second it was called with)
+        self._subscribers: dict[Tick, tuple[float, int]] = {}
+        self._pending: str | None = None
+        self._due: float | None = None
+        self.ticks = 0
+
+    def subscribe(self, tick: Tick, origin: float):
+        # tick(elapsed whole seconds since origin) now, and on every following second boundary
+        elapsed = int(time.monotonic() - origin)
+        self._subscribers[tick] = (origin, elapsed)
+        tick(elapsed)
+        self._schedule()
+
+    def unsubscribe(self, tick: Tick):
+        if self._subscribers.pop(tick, None) is None: return
+        if not self._subscribers: self._cancel()
+
+    def _cancel(self):
+        if self._pending is not None: self.widget.after_cancel(self._pending)
+        self._pending = self._due = None
+
+    def _schedule(self):
+        if not self._subscribers: return
+        now = time.monotonic()
+        due = min(origin + last + 1 for origin, last in self._subscribers.values())
+        if self._pending is not None and self._due is not None and self._due <= due: return
+        self._cancel()
+        self._due = due
+        self._pending = self.widget.after(max(1, math.ceil((due - now) * 1000)), self._tick)
+
+    def _tick(self):
+        self._pending = self._due = None
+        self.ticks += 1
+        now = time.monotonic()
+        for tick, (origin, last) in list(self._subscribers.items()):
+            elapsed = int(now - origin)
+            if elapsed == last or tick not in self._subscribers: continue
+            self._subscribers[tick] = (origin, elapsed)
+            tick(elapsed)
+        self._schedule()